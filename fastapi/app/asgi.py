@@ -3,16 +3,23 @@ from fastapi import FastAPI
 from pydantic import BaseModel
 from sentry_asgi import SentryMiddleware
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_503_SERVICE_UNAVAILABLE
 
 from database import database, metadata, generate_table
-from middleware.xframe import XFrameHeaderMiddleware
+from database.cache import MODEL_CACHE
+from database.pagination import InvalidCursor
+from middleware.compression import CompressionMiddleware
+from middleware.security import SecurityHeadersMiddleware
+from utils.email import MAILER
+from utils.http import HTTP_CLIENT
+from utils.password import PasswordQueueFull, shutdown_password_pool
+from utils.revocation import REVOCATIONS
 from .env import Env
 from .settings import settings
 
-
 APP_ARGS = {}
 if settings.ENV == Env.PRODUCTION:
     APP_ARGS.update({"openapi_url": None, "docs_url": None, "redoc_url": None})
@@ -21,6 +28,19 @@ if settings.ENV == Env.PRODUCTION:
 app = FastAPI(title="App", description="API for app.", version="0.1.0", **APP_ARGS)
 
 
+@app.exception_handler(PasswordQueueFull)
+async def password_queue_full(_request, _exc):
+    return JSONResponse(
+        {"detail": "Too many requests, try again later"},
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor(_request, _exc):
+    return JSONResponse({"detail": "Invalid cursor"}, status_code=HTTP_400_BAD_REQUEST)
+
+
 # Configure Middleware
 if settings.ENV == Env.PRODUCTION:
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.ALLOWED_HOSTS)
@@ -40,8 +60,8 @@ if settings.ENV == Env.PRODUCTION:
         app.add_middleware(CORSMiddleware, **opts)
     if settings.SENTRY_DSN:
         app.add_middleware(SentryMiddleware)
-    app.add_middleware(XFrameHeaderMiddleware)
-    app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_THRESHOLD)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.GZIP_THRESHOLD)
 
 
 @app.on_event("startup")
@@ -89,10 +109,18 @@ async def startup():
 
             sentry_sdk.init(dsn=settings.SENTRY_DSN)
 
-    # Init the database pool
+    # Init the database pool and model cache
     await database.connect()
+    await MODEL_CACHE.connect()
+    await REVOCATIONS.start()
+    HTTP_CLIENT.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    await REVOCATIONS.stop()
+    await MAILER.stop()
+    await HTTP_CLIENT.stop()
+    await MODEL_CACHE.disconnect()
     await database.disconnect()
+    shutdown_password_pool()
@@ -13,15 +13,43 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALLOWED_HOSTS: List[str] = None
     GZIP_THRESHOLD: int = 2048
+    # Compression level per encoding for each content type, "text/" matches all text types
+    COMPRESSION_LEVELS: dict = {
+        "application/json": {"br": 5, "zstd": 3, "gzip": 6},
+        "application/javascript": {"br": 5, "zstd": 3, "gzip": 6},
+        "image/svg+xml": {"br": 5, "zstd": 3, "gzip": 6},
+        "text/": {"br": 5, "zstd": 3, "gzip": 6},
+    }
+    COMPRESSION_HIGH_LOAD: float = 0.75
+    COMPRESSION_CACHE_BYTES: int = 32 * 1024 * 1024
+    SECURITY_HEADERS: dict = {
+        "X-Frame-Options": "sameorigin",
+        "X-Content-Type-Options": "nosniff",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    }
 
     # Paging
     DEFAULT_PAGE_SIZE: int = 50
     MAX_PAGE_SIZE: int = 250
+    ITERATE_CHUNK_SIZE: int = 500
 
     # Access Tokens
     TOKEN_ISSUER: str = "pyjwt"
     TOKEN_ALGORITHM: str = "HS256"
+    TOKEN_AUDIENCE: str = "app"
     TOKEN_EXPIRATION: int = (2 * 7 * 24 * 60 * 60)
+    TOKEN_CLAIMS_CACHE_SIZE: int = 4096
+    TOKEN_CLAIMS_TTL: int = 300
+    AUTH_USER_CACHE_SIZE: int = 4096
+    # Longest a process keeps using a user's is_staff/is_admin after another changed them
+    AUTH_USER_TTL: int = 30
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    # Longest other processes keep accepting a token after it was revoked
+    REVOCATION_SYNC_INTERVAL: int = 60
+
+    # Password hashing
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
 
     # CORS Configuration
     CORS_ALLOW_ORIGINS: List[str] = []
@@ -45,6 +73,7 @@ class Settings(BaseSettings):
     DB_POOL_OVERFLOW: int = 5
     DB_POOL_RECYCLE_TIMEOUT: int = 300
     DB_POOL_RECYCLE_QUERIES: int = 50000
+    BULK_BATCH_SIZE: int = 500
 
     # Redis
     REDIS_HOST: str = "localhost"
@@ -52,6 +81,49 @@ class Settings(BaseSettings):
     REDIS_DATABASE: int = 0
     REDIS_PASSWORD: str = None
 
+    # Model cache
+    MODEL_CACHE_SIZE: int = 1024
+    MODEL_CACHE_LOCAL_TTL: int = 5
+
+    # HTTP client for storage and CDN calls
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_KEEPALIVE_TIMEOUT: int = 30
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_TIMEOUT: int = None
+    HTTP_CONNECT_TIMEOUT: int = 10
+    HTTP_READ_TIMEOUT: int = 60
+
+    # Backblaze B2, account authorizations are valid for 24 hours
+    B2_API_URL: str = "https://api.backblazeb2.com"
+    B2_AUTH_LIFETIME: int = 24 * 60 * 60
+    B2_AUTH_REFRESH_MARGIN: int = 60 * 60
+    B2_UPLOAD_URL_POOL_SIZE: int = 4
+    B2_LARGE_FILE_THRESHOLD: int = 200 * 1024 * 1024
+    B2_PART_SIZE: int = 100 * 1024 * 1024
+    B2_PART_CONCURRENCY: int = 4
+
+    # BunnyCDN
+    BUNNYCDN_API_URL: str = "https://bunnycdn.com/api"
+    BUNNYCDN_STORAGE_URL: str = "https://storage.bunnycdn.com"
+
+    # Background jobs
+    JOB_CONCURRENCY: dict = {"resize_image": 2, "transcode_video": 1, "delete_media": 8}
+    JOB_DEFAULT_CONCURRENCY: int = 4
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_DELAY: int = 30
+    JOB_TIMEOUT: int = 60 * 60
+    JOB_POLL_INTERVAL: int = 1
+    JOB_RETENTION: int = 24 * 60 * 60
+
+    # Media uploads
+    MEDIA_DOWNLOAD_MAX_SIZE: int = 8 * 1024 * 1024 * 1024
+    MEDIA_DOWNLOAD_ATTEMPTS: int = 3
+    UPLOAD_CONCURRENCY: int = 4
+    UPLOAD_ATTEMPTS: int = 3
+    UPLOAD_RETRY_DELAY: float = 0.5
+    DELETE_CONCURRENCY: int = 16
+
     # Email
     EMAIL_FROM_EMAIL: EmailStr = None
     EMAIL_FROM_NAME: str = ""
@@ -61,6 +133,11 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = None
     SMTP_PORT: int = 587
     SMTP_TLS: bool = True
+    SMTP_TIMEOUT: int = 30
+    SMTP_IDLE_TIMEOUT: int = 60
+    SMTP_POOL_SIZE: int = 2
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_TEMPLATE_DIR: str = "emails/build"
 
     # Sentry
     SENTRY_DSN: UrlStr = None
@@ -72,6 +149,10 @@ class Settings(BaseSettings):
     # Sourcemaps
     SOURCEMAP_BUCKET: str = None
     SOURCEMAP_BUCKET_PROVIDER: str = None
+    SOURCEMAP_CACHE_DIR: str = "/tmp/sourcemaps"
+    SOURCEMAP_CACHE_SIZE: int = 32
+    SOURCEMAP_DISK_CACHE_SIZE: int = 256
+    SOURCEMAP_REVALIDATE: int = 300
 
     # Media
     MEDIA_BUCKET: str = None
@@ -0,0 +1,69 @@
+"""
+Compares the insert throughput of save(), bulk_create() and copy_from().
+
+Runs against the configured database in a temporary table that is dropped
+afterwards, e.g. ./venv/bin/python -m benchmarks.copy_from 100000
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+from typing import Set
+
+from sqlalchemy.schema import CreateTable, DropTable
+
+from database import DbBaseModel, HStore, Json, database, generate_table, metadata
+
+
+class CopyBenchmark(DbBaseModel):
+    name: str = ""
+    tags: Set[str] = set()
+    exif: HStore = {}
+    data: Json = None
+
+
+def make_rows(count):
+    return (
+        CopyBenchmark(
+            name=f"image{i}",
+            tags={"a", "b"},
+            exif={"Make": "Camera", "Width": str(i)},
+            data={"index": i},
+        )
+        for i in range(count)
+    )
+
+
+async def timed(name, count, coroutine):
+    start = perf_counter()
+    await coroutine
+    elapsed = perf_counter() - start
+    print(
+        f"{name:<12} {count:>8} rows {elapsed:8.2f}s {count / elapsed:10.0f} rows/sec"
+    )
+
+
+async def save_all(count):
+    for obj in make_rows(count):
+        await obj.save()
+
+
+async def main(count):
+    table = generate_table(CopyBenchmark, metadata)
+    await database.connect()
+    try:
+        await database.execute("CREATE EXTENSION IF NOT EXISTS hstore")
+        await database.execute(CreateTable(table))
+        # save() is much slower, so it only inserts a tenth of the rows
+        await timed("save", max(1, count // 10), save_all(max(1, count // 10)))
+        await timed(
+            "bulk_create", count, CopyBenchmark.bulk_create(list(make_rows(count)))
+        )
+        await timed("copy_from", count, CopyBenchmark.copy_from(make_rows(count)))
+    finally:
+        await database.execute(DropTable(table))
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,58 @@
+"""
+Compares sequential and concurrent deletes of media renditions.
+
+Serves the StorageStub from tests/test_bunnycdn.py locally in place of BunnyCDN
+storage, each delete takes about 10 ms, and runs delete_media_bulk() with
+DELETE_CONCURRENCY 1 and with the configured value,
+e.g. ./venv/bin/python -m benchmarks.delete_media 50
+"""
+
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+from aiohttp import web
+
+from app import settings
+from tests.test_bunnycdn import StorageStub
+from utils.http import HTTP_CLIENT
+from utils.uploads import delete_media_bulk
+
+
+async def main(count):
+    os.environ.setdefault("BUNNYCDN_ACCESS_KEY", "key")
+    os.environ.setdefault("BUNNYCDN_STORAGE_ACCESS_KEY", "storage-key")
+    settings.MEDIA_BUCKET = "media"
+    settings.MEDIA_BUCKET_PROVIDER = "bunnycdn"
+    stub = StorageStub()
+    app = web.Application()
+    app.router.add_delete("/media/{key:.+}", stub.delete)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    settings.BUNNYCDN_STORAGE_URL = f"http://127.0.0.1:{port}"
+
+    # count media items with two renditions each
+    items = [(1234560 + index, ".jpeg", ["150x150", "450"]) for index in range(count)]
+    concurrency = settings.DELETE_CONCURRENCY
+    try:
+        for name, limit in (("sequential", 1), ("concurrent", concurrency)):
+            settings.DELETE_CONCURRENCY = limit
+            start = perf_counter()
+            await delete_media_bulk(items)
+            elapsed = perf_counter() - start
+            print(
+                f"{name:10} ({limit:2} at once) {elapsed * 1e3:8.1f} ms"
+                f" for {count * 2} files"
+            )
+    finally:
+        settings.DELETE_CONCURRENCY = concurrency
+        await HTTP_CLIENT.stop()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,49 @@
+"""
+Measures parse_rows() against validating every row with parse_row().
+
+Uses in-memory rows shaped like the User table, no database is needed,
+e.g. ./venv/bin/python -m benchmarks.hydration 50000
+"""
+
+import sys
+from datetime import datetime
+from time import perf_counter
+
+from database import generate_table, metadata
+from models import User
+from utils.password import hash_password
+
+
+def main(count):
+    generate_table(User, metadata)
+    password = hash_password("password")
+    rows = [
+        {
+            "id": index + 1,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": f"user{index}@example.com",
+            "password": password,
+            "is_confirmed": True,
+            "is_staff": False,
+            "is_admin": False,
+            "joined": datetime(2020, 1, 1),
+        }
+        for index in range(count)
+    ]
+
+    start = perf_counter()
+    for row in rows:
+        User.parse_row(row)
+    validated = perf_counter() - start
+
+    start = perf_counter()
+    User.parse_rows(rows)
+    hydrated = perf_counter() - start
+
+    print(f"parse_row  {count / validated:10.0f} rows/sec")
+    print(f"parse_rows {count / hydrated:10.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
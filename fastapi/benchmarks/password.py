@@ -0,0 +1,80 @@
+"""
+Measures a burst of concurrent logins with and without the password process pool.
+
+Starts count check_password_async() calls at once and compares them with calling
+check_password() inline in each coroutine, as before the pool. Alongside the
+burst a ping coroutine stands in for the other requests the event loop serves.
+Reports p50/p99 of each login and each ping in ms,
+e.g. ./venv/bin/python -m benchmarks.password 32
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+
+from app import settings
+from utils.password import (
+    check_password,
+    check_password_async,
+    hash_password,
+    shutdown_password_pool,
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def inline(password, hashed):
+    return check_password(password, hashed)
+
+
+async def burst(check, count, hashed):
+    logins = []
+    pings = []
+    done = asyncio.Event()
+
+    async def login():
+        await check("password", hashed)
+        # All logins arrive together, so they wait from the start of the burst
+        logins.append(perf_counter() - start)
+
+    async def ping():
+        while not done.is_set():
+            start = perf_counter()
+            await asyncio.sleep(0.001)
+            pings.append(perf_counter() - start)
+
+    start = perf_counter()
+    pinger = asyncio.ensure_future(ping())
+    await asyncio.gather(*(login() for _ in range(count)))
+    done.set()
+    await pinger
+    return logins, pings
+
+
+async def main(count):
+    hashed = hash_password("password")
+    # Start the workers before measuring
+    await asyncio.gather(
+        *(
+            check_password_async("password", hashed)
+            for _ in range(settings.PASSWORD_HASH_WORKERS)
+        )
+    )
+    for name, check in (("inline", inline), ("pool", check_password_async)):
+        logins, pings = await burst(check, count, hashed)
+        print(
+            f"{name:6} login p50 {percentile(logins, 0.5) * 1e3:8.1f} ms"
+            f"  p99 {percentile(logins, 0.99) * 1e3:8.1f} ms"
+            f"   ping p50 {percentile(pings, 0.5) * 1e3:8.1f} ms"
+            f"  p99 {percentile(pings, 0.99) * 1e3:8.1f} ms"
+        )
+    shutdown_password_pool()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    # More would raise PasswordQueueFull instead of measuring the pool
+    asyncio.run(main(min(count, settings.PASSWORD_HASH_QUEUE_LIMIT)))
@@ -0,0 +1,83 @@
+"""
+Compares rendering a list of users with ModelJSONResponse to FastAPI's path.
+
+ModelJSONResponse is measured with orjson and with the json fallback, FastAPI's
+path validates the list against the route's response_model and encodes it with
+jsonable_encoder into a JSONResponse. Uses in-memory users, no database is
+needed, e.g. ./venv/bin/python -m benchmarks.responses 1000
+"""
+
+import sys
+from datetime import datetime
+from time import perf_counter
+from typing import List
+
+from fastapi.routing import APIRoute, serialize_response
+from starlette.responses import JSONResponse
+
+from database import generate_table, metadata, responses
+from database.responses import ModelJSONResponse
+from models import User
+from utils.password import hash_password
+
+REPEAT = 20
+
+
+def fastapi_response(field, users):
+    return JSONResponse(serialize_response(field=field, response=users))
+
+
+def main(count):
+    generate_table(User, metadata)
+    password = hash_password("password")
+    users = User.parse_rows(
+        [
+            {
+                "id": index + 1,
+                "first_name": "First",
+                "last_name": "Last",
+                "email": f"user{index}@example.com",
+                "password": password,
+                "is_confirmed": True,
+                "is_staff": False,
+                "is_admin": False,
+                "joined": datetime(2020, 1, 1),
+            }
+            for index in range(count)
+        ]
+    )
+
+    async def endpoint():
+        pass
+
+    route = APIRoute("/users", endpoint, response_model=List[User.response_model()])
+    field = route.secure_cloned_response_field
+    orjson = responses.orjson
+
+    def orjson_response(users):
+        responses.orjson = orjson
+        return ModelJSONResponse(users)
+
+    def json_response(users):
+        responses.orjson = None
+        return ModelJSONResponse(users)
+
+    candidates = [
+        ("ModelJSONResponse json", json_response),
+        ("response_model", lambda users: fastapi_response(field, users)),
+    ]
+    if orjson is not None:
+        candidates.insert(0, ("ModelJSONResponse orjson", orjson_response))
+
+    for name, render in candidates:
+        render(users)
+        start = perf_counter()
+        for _ in range(REPEAT):
+            render(users)
+        elapsed = (perf_counter() - start) / REPEAT
+        print(f"{name:24} {elapsed * 1e3:8.2f} ms/response of {count} users")
+    responses.orjson = orjson
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,43 @@
+"""
+Measures the overhead of the revocation check on the not revoked path.
+
+Compares REVOCATIONS.is_revoked() with a Bloom filter of REVOCATION_BLOOM_CAPACITY
+revoked tokens to decoding a token, e.g. ./venv/bin/python -m benchmarks.revocation
+"""
+
+import asyncio
+import sys
+from datetime import timedelta
+from time import perf_counter
+from uuid import uuid4
+
+from app import settings
+from utils.revocation import Revocations
+from utils.tokens import create_token, decode_token
+
+
+async def main(count):
+    revocations = Revocations(store=object())
+    for _ in range(settings.REVOCATION_BLOOM_CAPACITY):
+        revocations.bloom.add(uuid4().hex)
+    jtis = [uuid4().hex for _ in range(count)]
+    # Possible false positives would go to the store, which this benchmark doesn't have
+    jtis = [jti for jti in jtis if jti not in revocations.bloom]
+
+    start = perf_counter()
+    for jti in jtis:
+        await revocations.is_revoked(jti)
+    check = (perf_counter() - start) / len(jtis)
+
+    token = create_token(data={"sub": "1"}, expires_delta=timedelta(minutes=5))
+    start = perf_counter()
+    for _ in range(count):
+        decode_token(token)
+    decode = (perf_counter() - start) / count
+
+    print(f"is_revoked   {check * 1e6:8.2f} us/check")
+    print(f"decode_token {decode * 1e6:8.2f} us/token")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
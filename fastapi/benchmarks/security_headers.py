@@ -0,0 +1,87 @@
+"""
+Compares SecurityHeadersMiddleware to the BaseHTTPMiddleware it replaced.
+
+Calls a plain and a streaming Starlette route through each middleware as ASGI
+apps, no server is needed, and reports requests/sec,
+e.g. ./venv/bin/python -m benchmarks.security_headers 5000
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+
+from middleware.security import SecurityHeadersMiddleware
+
+
+class XFrameHeaderMiddleware(BaseHTTPMiddleware):
+    # The middleware as it was before SecurityHeadersMiddleware
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        if "X-Frame-Options" not in response.headers:
+            response.headers["X-Frame-Options"] = "sameorigin"
+        return response
+
+
+def make_app(middleware):
+    app = Starlette()
+    app.add_middleware(middleware)
+
+    @app.route("/plain")
+    async def plain(request):
+        return JSONResponse({"id": 1, "name": "plain"})
+
+    @app.route("/stream")
+    async def stream(request):
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 1024
+
+        return StreamingResponse(chunks())
+
+    return app
+
+
+async def run(app, path, count):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = perf_counter()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return count / (perf_counter() - start)
+
+
+async def main(count):
+    for name, middleware in (
+        ("BaseHTTPMiddleware", XFrameHeaderMiddleware),
+        ("SecurityHeaders", SecurityHeadersMiddleware),
+    ):
+        app = make_app(middleware)
+        for path in ("/plain", "/stream"):
+            await run(app, path, count // 10)
+            rate = await run(app, path, count)
+            print(f"{name:18} {path:7} {rate:10.0f} requests/sec")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -1,6 +1,8 @@
 from .engine import database, metadata
 from .generation import generate_column, generate_table
+from .loader import ModelLoader
 from .models import DbBaseModel, AbstractDbBaseModel, RequestData
+from .responses import ModelJSONResponse, model_response
 from .types import (
     PrimaryKey,
     ForeignKey,
@@ -19,9 +21,12 @@ __all__ = [
     "metadata",
     "generate_column",
     "generate_table",
+    "ModelLoader",
     "DbBaseModel",
     "AbstractDbBaseModel",
     "RequestData",
+    "ModelJSONResponse",
+    "model_response",
     "PrimaryKey",
     "ForeignKey",
     "ForeignKeyAction",
@@ -0,0 +1,134 @@
+"""
+Two tier read-through cache for DbBaseModel.get().
+
+Models opt in by setting cache_ttl (seconds) in their Config:
+
+    class User(DbBaseModel):
+        class Config:
+            cache_ttl = 300
+
+Lookups by id check a small in-process TTL/LRU first, then Redis, then the
+database. Models are stored in Redis as their JSON and re-parsed on a hit. The
+in-process tier uses the shorter MODEL_CACHE_LOCAL_TTL since only Redis is
+invalidated across processes. save() and delete() invalidate both tiers.
+Hits return a deep copy, so changes to list and dict fields never reach the
+cached model.
+
+Models with write only fields, such as password hashes and encrypted text, are
+only cached in process and never written to Redis. Hits are always complete
+models that can be assigned and saved, the write only fields are left out when
+the model is serialized for a response.
+
+Redis is optional, without aioredis installed or a connection the in-process
+tier is used on its own. Any client with async get/set/delete methods (such as
+a fakeredis stand-in) can be assigned to MODEL_CACHE.redis for testing.
+"""
+
+import json
+from collections import defaultdict
+
+from pydantic import validate_model
+
+from app import settings
+from utils.lru import LRUCache
+
+__all__ = ["MODEL_CACHE", "ModelCache"]
+
+
+class ModelCache:
+    def __init__(self):
+        self.local = LRUCache(settings.MODEL_CACHE_SIZE, settings.MODEL_CACHE_LOCAL_TTL)
+        self.redis = None
+        # model name -> {"local": hits, "redis": hits, "miss": misses}
+        self.metrics = defaultdict(lambda: {"local": 0, "redis": 0, "miss": 0})
+
+    async def connect(self):
+        try:
+            import aioredis
+        except ImportError:
+            return
+        self.redis = await aioredis.create_redis_pool(
+            (settings.REDIS_HOST, settings.REDIS_PORT),
+            db=settings.REDIS_DATABASE,
+            password=settings.REDIS_PASSWORD,
+        )
+
+    async def disconnect(self):
+        if self.redis is not None:
+            self.redis.close()
+            await self.redis.wait_closed()
+            self.redis = None
+
+    @staticmethod
+    def ttl(model):
+        return getattr(model.__config__, "cache_ttl", None)
+
+    @staticmethod
+    def key(model, id_):
+        return f"model:{model.table.name}:{id_}"
+
+    @staticmethod
+    def secrets(model):
+        # pylint: disable=protected-access
+        return {*model._write_only, *model._passwords}
+
+    def shared(self, model):
+        # Redis never holds secrets, and a model without them can't be saved
+        return self.redis is not None and not self.secrets(model)
+
+    @staticmethod
+    def parse(model, data):
+        """
+        Parse a model from its cached JSON.
+        """
+        values, fields_set, _ = validate_model(model, json.loads(data), raise_exc=False)
+        return model.construct(values, fields_set)
+
+    async def get(self, model, id_):
+        """
+        Return a copy of the cached model or None on a miss.
+        """
+        key = self.key(model, id_)
+        metrics = self.metrics[model.__name__]
+        obj = self.local.get(key)
+        if obj is not None:
+            metrics["local"] += 1
+            return obj.copy(deep=True)
+        if self.shared(model):
+            data = await self.redis.get(key)
+            if data is not None:
+                metrics["redis"] += 1
+                obj = self.parse(model, data)
+                self.local.set(key, obj, min(self.local.ttl, self.ttl(model)))
+                return obj.copy(deep=True)
+        metrics["miss"] += 1
+        return None
+
+    async def set(self, obj):
+        model = obj.__class__
+        ttl = self.ttl(model)
+        if not ttl or obj.id is None:
+            return
+        key = self.key(model, obj.id)
+        self.local.set(key, obj.copy(deep=True), min(self.local.ttl, ttl))
+        if self.shared(model):
+            await self.redis.set(key, obj.json(), expire=ttl)
+
+    async def delete(self, model, id_):
+        if not self.ttl(model) or id_ is None:
+            return
+        key = self.key(model, id_)
+        self.local.delete(key)
+        if self.redis is not None:
+            await self.redis.delete(key)
+
+    def stats(self):
+        stats = {}
+        for name, metrics in self.metrics.items():
+            total = metrics["local"] + metrics["redis"] + metrics["miss"]
+            hits = metrics["local"] + metrics["redis"]
+            stats[name] = {**metrics, "hit_rate": hits / total if total else 0.0}
+        return stats
+
+
+MODEL_CACHE = ModelCache()
@@ -0,0 +1,121 @@
+"""
+Bulk loading of models with the PostgreSQL binary COPY protocol.
+
+Values are converted for asyncpg's binary codecs from the column types that
+generate_table() created with map_type(), so the same mapping applies:
+
+    ENCRYPTEDTEXT -> encrypted the same as ENCRYPTEDTEXT.process_bind_param()
+    JSON, JSONB -> serialized JSON text
+    ARRAY -> list (sets and tuples are converted)
+    HSTORE -> dict of strings, with the hstore codec registered on the
+              connection for the COPY and reset afterwards
+    ENUM -> the enum value
+"""
+
+import json
+from enum import Enum
+
+from sqlalchemy.dialects.postgresql import ARRAY, HSTORE, JSON, JSONB
+
+from utils.encryption import encrypt
+from .engine import database, is_asyncpg
+from .generation import ENCRYPTEDTEXT
+
+__all__ = ["copy_models", "is_copy_supported"]
+
+
+CONVERTER_CACHE = {}
+
+
+def _json(value):
+    return value if value is None else json.dumps(value)
+
+
+def _array(value):
+    return value if value is None else list(value)
+
+
+def _hstore(value):
+    if value is None:
+        return value
+    return {k: v if v is None else str(v) for k, v in value.items()}
+
+
+def _encrypted(value):
+    return value if value is None else encrypt(value)
+
+
+def _enum(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _converter(sql_type):
+    if isinstance(sql_type, ENCRYPTEDTEXT):
+        return _encrypted
+    if isinstance(sql_type, (JSON, JSONB)):
+        return _json
+    if isinstance(sql_type, ARRAY):
+        return _array
+    if isinstance(sql_type, HSTORE):
+        return _hstore
+    return _enum
+
+
+def _converters(model):
+    if model not in CONVERTER_CACHE:
+        CONVERTER_CACHE[model] = [
+            (column.name, _converter(column.type)) for column in model.table.c
+        ]
+    return CONVERTER_CACHE[model]
+
+
+def is_copy_supported():
+    return is_asyncpg()
+
+
+async def copy_models(model, objs, read_only=False):
+    """
+    COPY an iterable of new model instances into the model's table, returns the row count.
+    Rows are generated lazily so any size of iterable can be streamed.
+    Columns left out of the first model's values (e.g. auto_now_add) use the server defaults.
+    """
+    # pylint: disable=protected-access
+    objs = iter(objs)
+    first = next(objs, None)
+    if first is None:
+        return 0
+    first_values = first._write_values(read_only, True)
+    converters = [
+        (name, convert) for name, convert in _converters(model) if name in first_values
+    ]
+
+    def records():
+        values = first_values
+        while True:
+            yield tuple(convert(values[name]) for name, convert in converters)
+            obj = next(objs, None)
+            if obj is None:
+                return
+            values = obj._write_values(read_only, True)
+
+    table = model.table
+    hstore = any(isinstance(column.type, HSTORE) for column in table.c)
+    async with database.connection() as connection:
+        raw_connection = connection.raw_connection
+        if hstore:
+            await raw_connection.set_builtin_type_codec(
+                "hstore", codec_name="pg_contrib.hstore"
+            )
+        try:
+            result = await raw_connection.copy_records_to_table(
+                table.name,
+                records=records(),
+                columns=[name for name, _ in converters],
+            )
+        finally:
+            if hstore:
+                # The connection goes back to the pool, where SQLAlchemy's HSTORE
+                # result processor expects hstore values as text
+                await raw_connection.reset_type_codec("hstore")
+    # asyncpg returns the command status such as "COPY 1000"
+    return int(result.split()[-1])
@@ -23,3 +23,11 @@ database = Database(
     max_inactive_connection_lifetime=settings.DB_POOL_RECYCLE_TIMEOUT,
 )
 metadata = MetaData()
+
+
+def is_asyncpg():
+    """
+    True when the database is using the asyncpg driver through databases.
+    """
+    url = database.url
+    return url.dialect == "postgresql" and url.driver in ("", "asyncpg")
@@ -0,0 +1,121 @@
+"""
+Batched hydration of database rows into model instances.
+
+Rows coming back from the database already hold values typed by the driver,
+so running the full pydantic validation on every column of every row is mostly
+wasted work on large result sets. A plan is computed once per model and row
+shape which splits the fields into:
+
+* trusted fields - copied straight from the row as the column type already
+matches the field type (ints, strings, timestamps, JSON, HSTORE, etc.)
+
+* validated fields - fields with class validators, computed fields, fields
+missing from the row or types the driver does not return as-is (e.g. sets)
+
+Instances are then built with construct() so only the validated fields pay for
+pydantic validation. Any row that fails validation falls back to parse_row()
+so the usual ValidationError is raised.
+"""
+
+from copy import deepcopy
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import get_type_hints
+from uuid import UUID
+
+from .types import Json
+
+__all__ = ["hydrate_rows"]
+
+
+PLAN_CACHE = {}
+
+# Python types that the database driver returns ready to use
+TRUSTED_TYPES = (str, int, float, bool, Decimal, datetime, date, time, timedelta, UUID)
+
+
+def _is_trusted(model, field, type_):
+    if field.name in model.__validators__ or field.schema.extra.get("computed"):
+        return False
+    if hasattr(type_, "__origin__"):
+        # ARRAY columns return lists, JSON and HSTORE columns return dicts
+        # Sets and tuples still need to be converted by the validators
+        return type_.__origin__ in (list, dict)
+    if type_ is Json or type_ in (list, dict):
+        return True
+    if not isinstance(type_, type):
+        return False
+    if issubclass(type_, Enum):
+        # The database returns the enum value rather than an enum member
+        return bool(model.__config__.use_enum_values)
+    return issubclass(type_, TRUSTED_TYPES)
+
+
+def _build_plan(model, keys):
+    hints = get_type_hints(model)
+    trusted = []
+    validated = []
+    for name, field in model.__fields__.items():
+        if field.alias in keys:
+            key = field.alias
+        elif name in keys:
+            key = name
+        else:
+            key = None
+        if key is not None and _is_trusted(model, field, hints.get(name)):
+            trusted.append((key, name))
+        else:
+            validated.append((key, field))
+    return tuple(trusted), tuple(validated)
+
+
+def get_plan(model, keys):
+    """
+    Return the cached (trusted, validated) plan for a model and row shape.
+    """
+    cache_key = (model, keys)
+    plan = PLAN_CACHE.get(cache_key)
+    if plan is None:
+        plan = PLAN_CACHE[cache_key] = _build_plan(model, keys)
+    return plan
+
+
+def _hydrate_row(model, plan, row):
+    trusted, validated = plan
+    values = {name: row[key] for key, name in trusted}
+    fields_set = set(values)
+    for key, field in validated:
+        if key is None:
+            if field.required:
+                return None
+            value = deepcopy(field.default)
+            if not field.validate_always:
+                values[field.name] = value
+                continue
+        else:
+            value = row[key]
+            fields_set.add(field.name)
+        value, errors = field.validate(value, values, loc=field.alias, cls=model)
+        if errors:
+            return None
+        values[field.name] = value
+    return model.construct(values, fields_set)
+
+
+def hydrate_rows(model, rows):
+    """
+    Generate a list of model instances from database rows, only validating the
+    fields that the database could not have typed already.
+    """
+    instances = []
+    plan = None
+    for row in rows:
+        if plan is None:
+            plan = get_plan(model, tuple(row.keys()))
+        instance = _hydrate_row(model, plan, row)
+        if instance is None:
+            # Run the full validation so the proper errors are raised
+            instance = model.parse_row(row)
+        instances.append(instance)
+    return instances
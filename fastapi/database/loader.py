@@ -0,0 +1,90 @@
+"""
+Request scoped loader and identity map for DbBaseModel.get().
+
+While a loader is active (see the model_loader dependency), get() calls with
+cached=True for the same model issued within one event loop tick are coalesced
+into a single WHERE id IN (...) query, and repeated lookups of the same id
+return the same instance for the rest of the request.
+"""
+
+import asyncio
+from contextvars import ContextVar
+
+from .cache import MODEL_CACHE
+
+__all__ = ["ModelLoader", "get_loader", "set_loader"]
+
+
+_LOADER = ContextVar("model_loader", default=None)
+
+
+def get_loader():
+    return _LOADER.get()
+
+
+def set_loader(loader):
+    return _LOADER.set(loader)
+
+
+class ModelLoader:
+    def __init__(self):
+        # (model, str(id)) -> instance
+        self.identity_map = {}
+        # model -> {str(id): (id, future)} waiting for the next batch
+        self.pending = {}
+
+    async def load(self, model, id_):
+        key = (model, str(id_))
+        if key in self.identity_map:
+            return self.identity_map[key]
+        batch = self.pending.get(model)
+        if batch is None:
+            batch = self.pending[model] = {}
+            asyncio.ensure_future(self._dispatch(model))
+        if key[1] not in batch:
+            batch[key[1]] = (id_, asyncio.get_event_loop().create_future())
+        return await batch[key[1]][1]
+
+    async def _dispatch(self, model):
+        # Let every coroutine ready in this tick add its id to the batch
+        await asyncio.sleep(0)
+        batch = self.pending.pop(model, {})
+        if not batch:
+            return
+        found = {}
+        try:
+            ids = []
+            for key, (id_, _) in batch.items():
+                obj = (
+                    await MODEL_CACHE.get(model, id_)
+                    if MODEL_CACHE.ttl(model)
+                    else None
+                )
+                if obj is not None:
+                    found[key] = obj
+                else:
+                    ids.append(id_)
+            if ids:
+                for obj in await model.read(model.c.id.in_(ids)):
+                    found[str(obj.id)] = obj
+                    await MODEL_CACHE.set(obj)
+        except Exception as e:  # pylint: disable=broad-except
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, (_, future) in batch.items():
+            obj = found.get(key)
+            if obj is not None:
+                self.identity_map[(model, key)] = obj
+            if not future.done():
+                future.set_result(obj)
+
+    def add(self, obj):
+        self.identity_map[(obj.__class__, str(obj.id))] = obj
+
+    def forget(self, model, id_):
+        self.identity_map.pop((model, str(id_)), None)
+
+    def clear(self):
+        self.identity_map.clear()
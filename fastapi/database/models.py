@@ -8,13 +8,22 @@ from typing import get_type_hints, Set, Dict, List
 
 from pydantic import BaseModel, Schema, validate_model, validator, Extra
 from pydantic.validators import _VALIDATORS
-from sqlalchemy import text, literal_column, String, func
+from sqlalchemy import cast, text, literal, literal_column, String, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.sql.expression import ClauseElement, Selectable, union_all, select
 
+from app import settings
 from utils.casing import camel_case_dict, camel_to_snake_case
+from utils.password import hash_password, hash_password_async, is_hashed_password
+from . import statements
+from .cache import MODEL_CACHE
+from .copy import copy_models, is_copy_supported
 from .engine import database, metadata
 from .generation import generate_table
-from .types import PrimaryKey
+from .hydration import hydrate_rows
+from .loader import get_loader
+from .pagination import decode_cursor, keyset_clause, keyset_columns, make_cursor
+from .types import PasswordStr, PrimaryKey
 
 __all__ = ["DbBaseModel", "AbstractDbBaseModel", "RequestData"]
 
@@ -51,6 +60,7 @@ class DbMetaModel(MetaModel):
         cls._read_only = set()
         cls._read_only_defaults = dict()
         cls._computed = set()
+        cls._passwords = set()
         cls._auto_now = set()
         cls._auto_now_add = set()
 
@@ -88,6 +98,10 @@ class DbMetaModel(MetaModel):
                         cls._read_only_defaults[field.name] = field.default
                 if field.schema.extra.get("computed"):
                     cls._computed.add(field.name)
+                if isinstance(field.type_, type) and issubclass(
+                    field.type_, PasswordStr
+                ):
+                    cls._passwords.add(field.name)
 
         super().__init__(_name, _bases, _dct)
 
@@ -142,22 +156,43 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
     def parse_rows(cls, rows):
         """
         Convenience method for generating a list of new instances from a ResultProxy.
+        Columns already typed by the database are not validated again.
         """
-        return [cls.parse_row(r) for r in rows]
+        return hydrate_rows(cls, rows)
 
     @classmethod
-    async def get(cls, clause_or_row_id, parse=True):
+    async def get(cls, clause_or_row_id, parse=True, cached=False):
         """
         Get a single model from the database based on id.
+        Set cached=True to batch and share lookups by id through the request's ModelLoader.
+        Lookups by id go through the MODEL_CACHE for models with a cache_ttl in their Config.
         """
-        if not isinstance(clause_or_row_id, ClauseElement):
-            clause_or_row_id = cls.c.id == clause_or_row_id
-        query = cls.table.select().where(clause_or_row_id)
-        result = await database.fetch_one(query)
-        obj = result
-        if parse and obj:
-            obj = cls.parse_row(obj)
-        return obj
+        if isinstance(clause_or_row_id, ClauseElement):
+            query = cls.table.select().where(clause_or_row_id)
+            result = await database.fetch_one(query)
+            if parse and result:
+                result = cls.parse_row(result)
+            return result
+        loader = get_loader()
+        if cached and parse and loader is not None:
+            return await loader.load(cls, clause_or_row_id)
+        use_cache = parse and MODEL_CACHE.ttl(cls)
+        if use_cache:
+            obj = await MODEL_CACHE.get(cls, clause_or_row_id)
+            if obj is not None:
+                return obj
+        result = await statements.fetch_one(
+            (cls, "get"),
+            lambda bound: cls.table.select().where(
+                cls.c.id == statements.param("v_id", bound)
+            ),
+            {"v_id": clause_or_row_id},
+        )
+        if parse and result:
+            result = cls.parse_row(result)
+            if use_cache:
+                await MODEL_CACHE.set(result)
+        return result
 
     @classmethod
     async def get_or_create(cls, clause_or_row_id, **defaults):
@@ -167,15 +202,29 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
         return obj
 
     @classmethod
-    async def read(
-        cls, clause_or_select=None, order_by=None, start=None, stop=None, parse=True
+    def keyset(cls, order_by=None):
+        """
+        Return the keyset columns (order_by columns plus id) and whether they are descending.
+        """
+        columns, descending = keyset_columns(order_by)
+        if "id" not in {c.name for c in columns}:
+            columns.append(cls.c.id)
+        return columns, descending
+
+    @classmethod
+    def cursor(cls, obj, order_by=None):
+        """
+        Create the opaque cursor for reading the page after obj with the same order_by.
+        """
+        columns, _ = cls.keyset(order_by)
+        return make_cursor(obj, [c.name for c in columns])
+
+    @classmethod
+    def read_query(
+        cls, clause_or_select=None, order_by=None, start=None, stop=None, cursor=None
     ):
         """
-        Read rows from the database.
-        Optionally give ordering, limits, and parsed into model instances.
-        order_by an be a single column or array of columns such as:
-        table.c.first_name, table.c.first_name.asc(), table.c.first_name.desc(),
-        (table.c.first_name.asc(), table.c.last_name.asc())
+        Build the select query used by read() and iterate().
         """
         if not isinstance(clause_or_select, Selectable):
             query = cls.table.select()
@@ -183,6 +232,16 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
                 query = query.where(clause_or_select)
         else:
             query = clause_or_select
+        if cursor is not None:
+            # Keyset pagination replaces the OFFSET with a row comparison
+            columns, descending = cls.keyset(order_by)
+            if cursor:
+                query = query.where(
+                    keyset_clause(columns, decode_cursor(cursor), descending)
+                )
+            order_by = [c.desc() if descending else c for c in columns]
+            stop = None if stop is None else stop - (start or 0)
+            start = None
         if order_by is not None:
             if isinstance(order_by, (list, tuple)):
                 query = query.order_by(*order_by)
@@ -193,39 +252,65 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
         if stop is not None:
             num = stop - (start or 0)
             query = query.limit(num)
+        return query
+
+    @classmethod
+    async def read(
+        cls,
+        clause_or_select=None,
+        order_by=None,
+        start=None,
+        stop=None,
+        parse=True,
+        cursor=None,
+    ):
+        """
+        Read rows from the database.
+        Optionally give ordering, limits, and parsed into model instances.
+        order_by an be a single column or array of columns such as:
+        table.c.first_name, table.c.first_name.asc(), table.c.first_name.desc(),
+        (table.c.first_name.asc(), table.c.last_name.asc())
+        Give a cursor from cursor() to read the page after it instead of using an offset,
+        an empty cursor reads the first page in the same keyset order.
+        """
+        query = cls.read_query(clause_or_select, order_by, start, stop, cursor)
         rows = await database.fetch_all(query)
         if parse:
             rows = cls.parse_rows(rows)
         return rows
 
+    @classmethod
+    async def iterate(
+        cls,
+        clause_or_select=None,
+        order_by=None,
+        start=None,
+        stop=None,
+        parse=True,
+        chunk_size=None,
+        cursor=None,
+    ):
+        """
+        Stream rows from the database with a server-side cursor, same arguments as read().
+        Rows are parsed chunk_size at a time so memory stays flat for any table size.
+        """
+        query = cls.read_query(clause_or_select, order_by, start, stop, cursor)
+        async for obj in _iterate_query(cls, query, parse, chunk_size):
+            yield obj
+
     @classmethod
     async def expand(cls, type_, model_or_models):
         """
         Given a list of homogeneous models expand their embedded fields.
-        TODO: make recursive where response_models also get expanded
+        Each relation is loaded with a single IN (...) query per nesting level,
+        embedded response_models with their own embeds are expanded recursively.
         TODO: support a reverse relationship key other than model_snake_case_id
         """
-        expanded = []
         single = not isinstance(model_or_models, (list, tuple))
         if single:
             model_or_models = [model_or_models]
-        ids = (m.id for m in model_or_models)
-        for model in model_or_models:
-            expanded.append(model.dict())
-        for embedded in type_._embedded:
-            embedded_id = f"{embedded}_id"
-            related_type = type_.__fields__[embedded].type_
-            related = related_type.get(type_.c.id.in_(ids))
-            related = {r.id: r for r in related}
-            for data in expanded:
-                data[embedded] = await related.get(data[embedded_id])
-        for embedded in type_._embedded_list:
-            reverse_id = f"{camel_to_snake_case(cls.__name__)}_id"
-            related_type = type_.__fields__[embedded].type_
-            for data in expanded:
-                data[embedded] = await related_type.read(
-                    getattr(related_type.c, reverse_id) == data["id"]
-                )
+        expanded = [model.dict() for model in model_or_models]
+        await _expand_data(cls, type_, expanded)
         expanded = [type_(**data) for data in expanded]
         if single:
             return expanded[0]
@@ -255,6 +340,7 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
                 )
             else:
                 self.assign(**update_values)
+        await self._hash_passwords()
         values = self.dict(exclude=exclude)
         if self.is_new or force_insert:
             if not read_only:
@@ -262,40 +348,265 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
                 self.assign(**cls._read_only_defaults)
             if force_insert:
                 values["id"] = self.id
-            query = table.insert().values(values).return_defaults()
-            result = await database.fetch_one(query)
+            names = tuple(sorted(values))
+            result = await statements.fetch_one(
+                (cls, "insert", names),
+                lambda bound: table.insert()
+                .values(
+                    {
+                        name: statements.param(f"v_{name}", bound, table.c[name].type)
+                        for name in names
+                    }
+                )
+                .return_defaults(),
+                {f"v_{name}": value for name, value in values.items()},
+            )
             if not force_insert:
                 self.id = result["id"]
+            loader = get_loader()
+            if loader is not None:
+                loader.add(self)
             for name in cls._auto_now_add:
                 if name in result:
                     setattr(self, name, result[name])
         else:
             # Implement the auto_now functionality
+            now = set()
             for name in cls._auto_now:
                 if not read_only or not update_values or name not in update_values:
-                    values[name] = text("NOW()")
-            query = (
-                table.update()
-                .where(table.c.id == self.id)
-                .values(values)
-                .return_defaults()
+                    values.pop(name, None)
+                    now.add(name)
+            names = tuple(sorted(values))
+            now = tuple(sorted(now))
+            params = {f"v_{name}": value for name, value in values.items()}
+            params["v_id"] = self.id
+            result = await statements.fetch_one(
+                (cls, "update", names, now),
+                lambda bound: table.update()
+                .where(table.c.id == statements.param("v_id", bound))
+                .values(
+                    {
+                        **{
+                            name: statements.param(
+                                f"v_{name}", bound, table.c[name].type
+                            )
+                            for name in names
+                        },
+                        **{name: text("NOW()") for name in now},
+                    }
+                )
+                .return_defaults(),
+                params,
             )
-            result = await database.fetch_one(query)
             for name in cls._auto_now:
                 if (
                     not read_only or not update_values or name not in update_values
                 ) and name in result:
                     setattr(self, name, result[name])
+            await MODEL_CACHE.delete(cls, self.id)
         return self
 
+    async def _hash_passwords(self):
+        """
+        Hash any passwords left unhashed by defer_password_hashing() in the process pool.
+        """
+        for name in self.__class__._passwords:
+            value = getattr(self, name, None)
+            if value and not is_hashed_password(value):
+                self.__values__[name] = await hash_password_async(value)
+
+    def _write_values(self, read_only=False, insert=False):
+        """
+        The column values to INSERT or UPDATE, same as save() without update_values.
+        """
+        cls = self.__class__
+        for name in cls._passwords:
+            value = getattr(self, name, None)
+            if value and not is_hashed_password(value):
+                self.__values__[name] = hash_password(value)
+        if not read_only:
+            exclude = {"id", *cls._read_only, *cls._computed}
+        else:
+            exclude = {"id", *cls._computed}
+        values = self.dict(exclude=exclude)
+        if insert and not read_only:
+            values.update(cls._read_only_defaults)
+            self.assign(**cls._read_only_defaults)
+        return values
+
+    @classmethod
+    def _returning(cls):
+        """
+        Columns that the server may set and are written back onto instances after bulk writes.
+        """
+        names = {"id", *cls._read_only, *cls._auto_now, *cls._auto_now_add}
+        return [c for c in cls.table.c if c.name in names]
+
+    @classmethod
+    def _apply_returned(cls, obj, row):
+        for key in row.keys():
+            if key == "id":
+                obj.id = row[key]
+            elif getattr(obj, key) != row[key]:
+                setattr(obj, key, row[key])
+
+    @classmethod
+    async def bulk_create(cls, objs, read_only=False, batch_size=None):
+        """
+        INSERT many new models with multi-row statements of batch_size rows each.
+        Server generated ids and defaults are set back onto the instances.
+        """
+        # pylint: disable=protected-access, no-value-for-parameter
+        table = cls.table
+        returning = cls._returning()
+        for batch in _batches(objs, batch_size):
+            values = [obj._write_values(read_only, True) for obj in batch]
+            query = table.insert().values(values).returning(*returning)
+            # Postgres returns the rows of a multi-row INSERT in VALUES order
+            rows = await database.fetch_all(query)
+            for obj, row in zip(batch, rows):
+                cls._apply_returned(obj, row)
+        _add_to_loader(objs)
+        return objs
+
+    @classmethod
+    async def bulk_update(cls, objs, read_only=False, batch_size=None):
+        """
+        UPDATE many existing models with an UPDATE ... FROM (VALUES ...) of batch_size rows each.
+        auto_now fields are set to NOW() the same as save().
+        """
+        # pylint: disable=protected-access, no-value-for-parameter
+        table = cls.table
+        returning = cls._returning()
+        for batch in _batches(objs, batch_size):
+            selects = []
+            for obj in batch:
+                values = obj._write_values(read_only)
+                values["id"] = obj.id
+                selects.append(
+                    select(
+                        [
+                            cast(value, table.c[name].type).label(name)
+                            for name, value in values.items()
+                        ]
+                    )
+                )
+            names = [name for name in values if name != "id"]
+            rows = union_all(*selects).alias("bulk_values")
+            values = {name: rows.c[name] for name in names}
+            for name in cls._auto_now:
+                values[name] = text("NOW()")
+            query = (
+                table.update()
+                .where(table.c.id == rows.c.id)
+                .values(values)
+                .returning(*returning)
+            )
+            updated = {row["id"]: row for row in await database.fetch_all(query)}
+            for obj in batch:
+                if obj.id in updated:
+                    cls._apply_returned(obj, updated[obj.id])
+                await MODEL_CACHE.delete(cls, obj.id)
+        return objs
+
+    @classmethod
+    async def bulk_upsert(
+        cls, objs, conflict=("id",), read_only=False, batch_size=None
+    ):
+        """
+        INSERT ... ON CONFLICT (conflict) DO UPDATE many models with batch_size rows each.
+        Conflicting rows are updated the same as save() would, read_only fields
+        are kept unless read_only=True and auto_now fields are set to NOW().
+        Raises ValueError if two of the models have the same conflict values,
+        Postgres can't update a row twice in one statement.
+        """
+        # pylint: disable=protected-access, no-value-for-parameter
+        table = cls.table
+        objs = list(objs)
+        conflict = tuple(conflict)
+        returning = cls._returning()
+        returning += [c for c in table.c if c.name in conflict and c not in returning]
+        if not read_only:
+            keep = {"id", *cls._read_only, *cls._auto_now_add, *conflict}
+        else:
+            keep = {"id", *cls._auto_now_add, *conflict}
+        # Rows are grouped by whether they have an id, to keep each multi-row VALUES
+        # homogeneous, and by whether their conflict values have a NULL. Rows without
+        # NULLs are matched back to the RETURNING rows by their conflict values,
+        # rows with NULLs never conflict and are returned in VALUES order.
+        groups = {}
+        seen = set()
+        for obj in objs:
+            row = obj._write_values(read_only, True)
+            if obj.id is not None:
+                row["id"] = obj.id
+            key = tuple(row.get(name) for name in conflict)
+            if None in key:
+                key = None
+            elif key in seen:
+                raise ValueError(
+                    f"Duplicate {', '.join(conflict)} {key} in bulk_upsert"
+                )
+            else:
+                seen.add(key)
+            groups.setdefault((obj.id is None, key is None), []).append((obj, row, key))
+        for group in groups.values():
+            for batch in _batches(group, batch_size):
+                values = [row for _, row, _ in batch]
+                query = pg_insert(table).values(values)
+                update = {
+                    name: query.excluded[name] for name in values[0] if name not in keep
+                }
+                for name in cls._auto_now:
+                    update[name] = text("NOW()")
+                query = query.on_conflict_do_update(
+                    index_elements=list(conflict), set_=update
+                ).returning(*returning)
+                rows = await database.fetch_all(query)
+                if batch[0][2] is None:
+                    matched = zip((obj for obj, _, _ in batch), rows)
+                else:
+                    by_key = {key: obj for obj, _, key in batch}
+                    matched = (
+                        (by_key[tuple(row[name] for name in conflict)], row)
+                        for row in rows
+                    )
+                for obj, row in matched:
+                    cls._apply_returned(obj, row)
+                    await MODEL_CACHE.delete(cls, obj.id)
+        _add_to_loader(objs)
+        return objs
+
+    @classmethod
+    async def copy_from(cls, objs, read_only=False):
+        """
+        Stream an iterable of new models into the table with the binary COPY protocol.
+        Much faster than bulk_create() for very large loads, but ids and server
+        defaults are not set back onto the instances.
+        Falls back to bulk_create() when the driver is not asyncpg.
+        """
+        if not is_copy_supported():
+            objs = await cls.bulk_create(list(objs), read_only)
+            return len(objs)
+        return await copy_models(cls, objs, read_only)
+
     async def delete(self):
         """
         Delete the model from the database.
         """
         # pylint: disable=protected-access, no-value-for-parameter
         table = self.__class__.table
-        query = table.delete().where(table.c.id == self.id)
-        await database.execute(query)
+        await statements.execute(
+            (self.__class__, "delete"),
+            lambda bound: table.delete().where(
+                table.c.id == statements.param("v_id", bound)
+            ),
+            {"v_id": self.id},
+        )
+        loader = get_loader()
+        if loader is not None:
+            loader.forget(self.__class__, self.id)
+        await MODEL_CACHE.delete(self.__class__, self.id)
         self.id = None
         return self
 
@@ -304,7 +615,8 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
         query = select([func.count()]).select_from(cls.table)
         if isinstance(clause, ClauseElement):
             query = query.where(clause)
-        return await database.fetch_val(query)
+            return await database.fetch_val(query)
+        return await statements.fetch_val((cls, "count"), lambda _: query, {})
 
     @classmethod
     def response_model(
@@ -337,11 +649,12 @@ class DbBaseModel(BaseModel, metaclass=DbMetaModel):
         }
         namespace["_embedded"] = set()
         namespace["_embedded_list"] = set()
+        # The database model the response model was created from, used by expand()
+        namespace["_model"] = cls
         for key, model in embed.items():
             # All embedded models should also be response_models to remove write_only fields
-            # TODO: expand will also need to support this
-            # if issubclass(model, DbBaseModel):
-            #     model = model.response_model()
+            if issubclass(model, DbBaseModel):
+                model = model.response_model()
             key_id = f"{key}_id"
             # If embedding a ForeignKey assume that it is a single model, otherwise a list
             if key_id in cls.__fields__:
@@ -419,18 +732,34 @@ class AbstractDbBaseModel(BaseModel):
     def parse_rows(cls, rows):
         """
         Convenience method for generating a list of new instances from a ResultProxy.
+        Columns already typed by the database are not validated again.
         """
-        return [cls.parse_row(r) for r in rows]
+        return hydrate_rows(cls, rows)
 
     @classmethod
-    async def union(
-        cls, subclasses, clauses=None, order_by=None, start=None, stop=None, parse=True
+    def union_cursor(cls, obj, order_by=None):
+        """
+        Create the opaque cursor for the union page after obj, order_by is the same as for union().
+        """
+        if isinstance(order_by, (list, tuple)):
+            order_by = order_by[0]
+        columns, _ = keyset_columns(order_by)
+        names = [c.name for c in columns if c.name != "id"]
+        return make_cursor(obj, [*names, "id", "_type"])
+
+    @classmethod
+    def union_query(
+        cls, subclasses, clauses=None, order_by=None, start=None, stop=None, cursor=None
     ):
         """
-        Perform a union across multiple subclasses (tables) and combining into a single abstract base class model.
+        Build the union query used by union() and union_iter().
         """
         queries = []
         common = {f.name for f in cls.__fields__.values()}
+        keyset_paging = cursor is not None
+        values = decode_cursor(cursor) if cursor else None
+        names = []
+        descending = False
         for i, subcls in enumerate(subclasses):
             columns = [c for c in subcls.columns if c.name in common]
             columns.append(
@@ -442,25 +771,153 @@ class AbstractDbBaseModel(BaseModel):
                     query = query.where(clauses[i])
                 else:
                     query = query.where(clauses)
-            if order_by:
+            if keyset_paging:
+                # Ids are only unique per table so _type is the final tie breaker
+                sub_order = order_by
+                if isinstance(order_by, (list, tuple)):
+                    sub_order = order_by[i]
+                keyset, descending = keyset_columns(sub_order)
+                keyset = [c for c in keyset if c.name != "id"]
+                names = [c.name for c in keyset]
+                keyset.append(subcls.c.id)
+                keyset.append(literal(subcls.__name__, String))
+                if values is not None:
+                    query = query.where(keyset_clause(keyset, values, descending))
+            elif order_by:
                 if isinstance(order_by, (list, tuple)):
                     query = query.order_by(order_by[i])
                 else:
                     query = query.order_by(order_by)
             queries.append(query)
         query = union_all(*queries)
+        if keyset_paging:
+            keyset = [literal_column(name) for name in (*names, "id", "_type")]
+            query = query.order_by(*(c.desc() if descending else c for c in keyset))
+            stop = None if stop is None else stop - (start or 0)
+            start = None
         if start is not None:
             query = query.offset(start)
         if stop is not None:
             num = stop - (start or 0)
             query = query.limit(num)
+        return query
+
+    @classmethod
+    async def union(
+        cls,
+        subclasses,
+        clauses=None,
+        order_by=None,
+        start=None,
+        stop=None,
+        parse=True,
+        cursor=None,
+    ):
+        """
+        Perform a union across multiple subclasses (tables) and combining into a single abstract base class model.
+        Give a cursor from union_cursor() to read the page after it instead of using an offset,
+        an empty cursor reads the first page in the same keyset order.
+        The ordered columns must then have the same names in all of the subclasses.
+        """
+        query = cls.union_query(subclasses, clauses, order_by, start, stop, cursor)
         rows = await database.fetch_all(query)
         if parse:
             rows = cls.parse_rows(rows)
         return rows
 
+    @classmethod
+    async def union_iter(
+        cls,
+        subclasses,
+        clauses=None,
+        order_by=None,
+        start=None,
+        stop=None,
+        parse=True,
+        chunk_size=None,
+        cursor=None,
+    ):
+        """
+        Stream the union across multiple subclasses with a server-side cursor, same arguments as union().
+        """
+        query = cls.union_query(subclasses, clauses, order_by, start, stop, cursor)
+        async for obj in _iterate_query(cls, query, parse, chunk_size):
+            yield obj
+
+
+def _batches(items, batch_size=None):
+    items = list(items)
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    for i in range(0, len(items), batch_size):
+        yield items[i : i + batch_size]
+
+
+def _add_to_loader(objs):
+    loader = get_loader()
+    if loader is not None:
+        for obj in objs:
+            loader.add(obj)
+
+
+async def _expand_data(model, type_, items):
+    """
+    Fill in the embedded fields of type_ for a list of dicts read from model,
+    batching each relation into one query and grouping the results in memory.
+    """
+    if not items:
+        return
+    for embedded in getattr(type_, "_embedded", ()):
+        embedded_id = f"{embedded}_id"
+        embedded_type = type_.__fields__[embedded].type_
+        related_type = getattr(embedded_type, "_model", embedded_type)
+        ids = {data[embedded_id] for data in items if data.get(embedded_id) is not None}
+        related = []
+        if ids:
+            rows = await related_type.read(
+                related_type.c.id.in_(list(ids)), parse=False
+            )
+            related = [{key: row[key] for key in row.keys()} for row in rows]
+            await _expand_data(related_type, embedded_type, related)
+        related = {r["id"]: r for r in related}
+        for data in items:
+            data[embedded] = related.get(data.get(embedded_id))
+    for embedded in getattr(type_, "_embedded_list", ()):
+        reverse_id = f"{camel_to_snake_case(model.__name__)}_id"
+        embedded_type = type_.__fields__[embedded].type_
+        related_type = getattr(embedded_type, "_model", embedded_type)
+        ids = [data["id"] for data in items]
+        rows = await related_type.read(
+            getattr(related_type.c, reverse_id).in_(ids), parse=False
+        )
+        related = [{key: row[key] for key in row.keys()} for row in rows]
+        await _expand_data(related_type, embedded_type, related)
+        grouped = {}
+        for data in related:
+            grouped.setdefault(data[reverse_id], []).append(data)
+        for data in items:
+            data[embedded] = grouped.get(data["id"], [])
+
+
+async def _iterate_query(model, query, parse, chunk_size):
+    """
+    Yield rows of a query from Database.iterate(), parsing them chunk_size at a time.
+    """
+    if not parse:
+        async for row in database.iterate(query):
+            yield row
+        return
+    chunk_size = chunk_size or settings.ITERATE_CHUNK_SIZE
+    chunk = []
+    async for row in database.iterate(query):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            for obj in model.parse_rows(chunk):
+                yield obj
+            chunk = []
+    for obj in model.parse_rows(chunk):
+        yield obj
+
 
 class RequestData(BaseModel):
     class Config:
         extra = Extra.allow
-
@@ -0,0 +1,172 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Instead of OFFSET/LIMIT, which scans and discards every row before the page,
+a cursor stores the order_by values and id of the last row seen and the next
+page is selected with a row comparison such as WHERE (created, id) > (...).
+Cursors are opaque url-safe base64 encoded JSON lists.
+
+All order_by columns must be sorted in the same direction, the id (and _type
+for unions) is always appended as the tie breaker. Cursors come from clients,
+so a cursor that doesn't decode or doesn't match the keyset columns in number
+and types raises InvalidCursor.
+"""
+
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime, date, time
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+
+from sqlalchemy import literal, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+
+__all__ = [
+    "InvalidCursor",
+    "encode_cursor",
+    "decode_cursor",
+    "check_cursor",
+    "keyset_columns",
+    "keyset_clause",
+    "make_cursor",
+]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, time):
+        return {"t": value.isoformat()}
+    if isinstance(value, UUID):
+        return {"u": str(value)}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "t" in value:
+            return time.fromisoformat(value["t"])
+        if "u" in value:
+            return UUID(value["u"])
+        if "n" in value:
+            return Decimal(value["n"])
+        raise InvalidCursor("Invalid cursor value")
+    return value
+
+
+def encode_cursor(values):
+    data = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return urlsafe_b64encode(data.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor back into a list of values, raises InvalidCursor if invalid.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(urlsafe_b64decode(padded.encode("utf-8")))
+        if not isinstance(values, list):
+            raise InvalidCursor("Invalid cursor")
+        return [_decode_value(v) for v in values]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _check_value(column, value):
+    if value is None:
+        return True
+    python_type = _python_type(column)
+    if python_type is None:
+        return True
+    if isinstance(python_type, type) and issubclass(python_type, Enum):
+        return value in {member.value for member in python_type}
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+    if python_type in (int, float, Decimal):
+        return isinstance(value, (int, float, Decimal))
+    return isinstance(value, python_type)
+
+
+def check_cursor(columns, values):
+    """
+    Raise InvalidCursor unless the values match the keyset columns in number and types.
+    """
+    if len(columns) != len(values):
+        raise InvalidCursor("Invalid cursor")
+    for column, value in zip(columns, values):
+        if not _check_value(column, value):
+            raise InvalidCursor("Invalid cursor")
+
+
+def keyset_columns(order_by):
+    """
+    Split order_by into a list of plain columns and whether they are descending.
+    """
+    if order_by is None:
+        order_by = ()
+    elif not isinstance(order_by, (list, tuple)):
+        order_by = (order_by,)
+    columns = []
+    directions = set()
+    for item in order_by:
+        if isinstance(item, UnaryExpression) and item.modifier in (
+            operators.asc_op,
+            operators.desc_op,
+        ):
+            directions.add(item.modifier is operators.desc_op)
+            item = item.element
+        else:
+            directions.add(False)
+        columns.append(item)
+    if len(directions) > 1:
+        raise ValueError("Keyset pagination requires a single order_by direction")
+    return columns, directions == {True}
+
+
+def keyset_clause(columns, values, descending=False):
+    """
+    Return the row comparison (col, ..., id) > (value, ..., id) clause.
+    """
+    check_cursor(columns, values)
+    left = tuple_(*columns)
+    right = tuple_(*(literal(v, c.type) for c, v in zip(columns, values)))
+    return left < right if descending else left > right
+
+
+def make_cursor(obj, names):
+    """
+    Create the cursor that continues after obj, a model instance or a row.
+    """
+    values = []
+    for name in names:
+        if name == "_type" and hasattr(obj, "subclass_name"):
+            values.append(obj.subclass_name)
+        elif hasattr(obj, "__fields__"):
+            values.append(getattr(obj, name))
+        else:
+            values.append(obj[name])
+    return encode_cursor(values)
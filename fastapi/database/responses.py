@@ -0,0 +1,117 @@
+"""
+Fast JSON responses for trusted model instances.
+
+Models loaded from the database or saved through DbBaseModel were already
+validated, so running them through FastAPI's response_model validation and
+jsonable_encoder again only costs CPU. ModelJSONResponse serializes model
+instances (or lists of them) directly, with orjson when it is installed.
+
+A plan is computed once per model class listing the (field name, output key)
+pairs, leaving out the _write_only fields and using each field's alias for the
+key, the same output response_model() and FastAPI produce.
+
+Use the model_response decorator on routes that return models with the default
+200 status, or return a ModelJSONResponse to set headers or a status code.
+The route's response_model is still used for the OpenAPI schema.
+"""
+
+import json
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from functools import wraps
+from uuid import UUID
+
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .models import DbBaseModel, AbstractDbBaseModel
+
+__all__ = ["ModelJSONResponse", "model_response", "model_dict"]
+
+
+PLAN_CACHE = {}
+
+
+def get_plan(model):
+    plan = PLAN_CACHE.get(model)
+    if plan is None:
+        exclude = getattr(model, "_write_only", set())
+        plan = PLAN_CACHE[model] = tuple(
+            (name, field.alias)
+            for name, field in model.__fields__.items()
+            if name not in exclude
+        )
+    return plan
+
+
+def model_dict(obj):
+    """
+    Return the values of a model instance for a response, nested values are left
+    for the JSON encoder.
+    """
+    values = obj.__dict__
+    return {key: values.get(name) for name, key in get_plan(obj.__class__)}
+
+
+def _default(value):
+    # Called by the encoder for every value it can't serialize itself
+    if isinstance(value, BaseModel):
+        return model_dict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not serializable")
+
+
+def _is_trusted(content):
+    if isinstance(content, list):
+        return all(
+            isinstance(item, (DbBaseModel, AbstractDbBaseModel)) for item in content
+        )
+    return isinstance(content, (DbBaseModel, AbstractDbBaseModel))
+
+
+class ModelJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(
+            content,
+            default=_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+def model_response(endpoint):
+    """
+    Return models, or lists of models, from the endpoint as a ModelJSONResponse.
+    Any other result is left for FastAPI to validate and encode as usual.
+    """
+
+    @wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if not isinstance(result, Response) and _is_trusted(result):
+            return ModelJSONResponse(result)
+        return result
+
+    return wrapper
@@ -0,0 +1,175 @@
+"""
+Per-model cache of compiled, parameterized CRUD statements.
+
+The shape of queries such as User.get(id) or user.save() with a fixed set of
+columns never changes, so they are compiled once with bind parameters and the
+SQL string is reused. Statements are executed directly on the asyncpg
+connection of the pool, which keeps them as prepared statements in its own
+per-connection statement cache, skipping both the SQLAlchemy and databases
+compile steps. Rows are wrapped in the same Record type as databases returns.
+
+Only used with the asyncpg driver, STATEMENT_CACHE.stats() reports the hit
+rate and the compile time saved. Queries are built by a build(values) callable
+using param() for their bind parameters: build(None) gives the query to
+compile, while build(values) gives the query with the values bound, which is
+run through the public databases API by the other drivers.
+
+This relies on private APIs of databases 0.2 (PostgresBackend._dialect and the
+Record constructor) and SQLAlchemy 1.3 (SQLCompiler._bind_processors and
+_result_columns). If compiling a statement fails because they changed, the
+cache disables itself and queries fall back to the public databases API.
+"""
+
+from time import perf_counter
+
+from databases.backends.postgres import Record
+from sqlalchemy import bindparam
+
+from .engine import database, is_asyncpg
+
+__all__ = [
+    "STATEMENT_CACHE",
+    "CompiledStatement",
+    "StatementCache",
+    "param",
+    "fetch_one",
+    "fetch_val",
+    "execute",
+]
+
+
+class CompiledStatement:
+    """
+    A query compiled to asyncpg's $n parameter style.
+    Bind parameters should be named after the keys of the values given to args().
+    """
+
+    def __init__(self, query):
+        # pylint: disable=protected-access
+        dialect = database._backend._dialect
+        compiled = query.compile(dialect=dialect)
+        names = sorted(compiled.params.keys())
+        mapping = {name: "$" + str(i) for i, name in enumerate(names, start=1)}
+        processors = compiled._bind_processors
+        self.dialect = dialect
+        self.sql = compiled.string % mapping
+        self.params = [(name, processors.get(name)) for name in names]
+        self.result_columns = compiled._result_columns
+        # Fail now rather than after running the query if Record changed
+        Record(None, self.result_columns, dialect)
+
+    def args(self, values):
+        return [
+            processor(values[name]) if processor else values[name]
+            for name, processor in self.params
+        ]
+
+    def record(self, row):
+        if row is None:
+            return None
+        return Record(row, self.result_columns, self.dialect)
+
+    async def fetch_one(self, values):
+        async with database.connection() as connection:
+            row = await connection.raw_connection.fetchrow(self.sql, *self.args(values))
+        return self.record(row)
+
+    async def fetch_val(self, values):
+        async with database.connection() as connection:
+            return await connection.raw_connection.fetchval(
+                self.sql, *self.args(values)
+            )
+
+    async def execute(self, values):
+        async with database.connection() as connection:
+            return await connection.raw_connection.execute(self.sql, *self.args(values))
+
+
+class StatementCache:
+    def __init__(self):
+        self.statements = {}
+        self.hits = 0
+        self.misses = 0
+        self.compile_time = 0.0
+        # Cleared when the private APIs CompiledStatement uses are missing
+        self.supported = True
+
+    def get(self, key, build):
+        """
+        Return the compiled statement for key, calling build(None) for the query on a miss.
+        Returns None if statements can't be compiled with this databases or SQLAlchemy.
+        """
+        statement = self.statements.get(key)
+        if statement is not None:
+            self.hits += 1
+            return statement
+        self.misses += 1
+        start = perf_counter()
+        try:
+            statement = CompiledStatement(build(None))
+        except (AttributeError, TypeError, ValueError) as e:
+            self.supported = False
+            print(
+                f"Warning: statement cache disabled, unsupported databases API: {e!r}"
+            )
+            return None
+        self.compile_time += perf_counter() - start
+        self.statements[key] = statement
+        return statement
+
+    def clear(self):
+        self.statements.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        average = self.compile_time / self.misses if self.misses else 0.0
+        return {
+            "statements": len(self.statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "compile_time": self.compile_time,
+            "compile_time_saved": self.hits * average,
+        }
+
+
+STATEMENT_CACHE = StatementCache()
+
+
+def param(name, values, type_=None):
+    """
+    A bind parameter of a cached statement, bound to values[name] unless values is None.
+    """
+    if values is None:
+        return bindparam(name, type_=type_)
+    return bindparam(name, values[name], type_=type_)
+
+
+def _statement(key, build):
+    if is_asyncpg() and STATEMENT_CACHE.supported:
+        return STATEMENT_CACHE.get(key, build)
+    return None
+
+
+async def fetch_one(key, build, values):
+    """
+    Run the cached statement for key, see param() for build.
+    """
+    statement = _statement(key, build)
+    if statement is not None:
+        return await statement.fetch_one(values)
+    return await database.fetch_one(build(values))
+
+
+async def fetch_val(key, build, values):
+    statement = _statement(key, build)
+    if statement is not None:
+        return await statement.fetch_val(values)
+    return await database.fetch_val(build(values))
+
+
+async def execute(key, build, values):
+    statement = _statement(key, build)
+    if statement is not None:
+        return await statement.execute(values)
+    return await database.execute(build(values))
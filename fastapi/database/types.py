@@ -3,6 +3,7 @@ PasswordStr and EncryptedStr are two additional Pydantic fields which are not hi
 from the database unlike SecretStr.
 """
 import re
+from contextvars import ContextVar
 from enum import Enum
 from typing import Dict
 
@@ -68,6 +69,17 @@ class ForeignKeyAction(str, Enum):
         return self.value
 
 
+_DEFER_PASSWORD_HASHING = ContextVar("defer_password_hashing", default=False)
+
+
+def defer_password_hashing(defer=True):
+    """
+    Leave validated passwords unhashed in the current context,
+    DbBaseModel.save() then hashes them in the password process pool.
+    """
+    _DEFER_PASSWORD_HASHING.set(defer)
+
+
 class PasswordStr(str):
     """
     Type suitable to hash and store a password in the database.
@@ -107,7 +119,8 @@ class PasswordStr(str):
         if not is_hashed_password(value):
             for validator in cls.__get_constr_validators__():
                 value = validator(cls, value, values, field, config)
-            value = hash_password(value)
+            if not _DEFER_PASSWORD_HASHING.get():
+                value = hash_password(value)
         return value
 
 
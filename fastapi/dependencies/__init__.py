@@ -1,13 +1,18 @@
 from .common import CommonQueryParams
 from .current_admin import current_admin
 from .current_staff import current_staff
-from .current_user import current_user
+from .current_user import current_auth_user, current_user
+from .defer_password_hashing import defer_password_hashing
 from .is_ajax import is_ajax
+from .model_loader import model_loader
 
 __all__ = [
     'CommonQueryParams',
     'current_admin',
+    'current_auth_user',
     'current_staff',
     'current_user',
+    'defer_password_hashing',
     'is_ajax',
+    'model_loader',
 ]
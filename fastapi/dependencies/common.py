@@ -1,4 +1,8 @@
+from fastapi import HTTPException
+from starlette.status import HTTP_400_BAD_REQUEST
+
 from app import settings
+from database.pagination import InvalidCursor, decode_cursor
 
 
 class CommonQueryParams:
@@ -8,6 +12,7 @@ class CommonQueryParams:
         order_by: str = None,
         page: int = None,
         page_size: int = None,
+        cursor: str = None,
     ):
         self.q = q
         self.order_by = order_by
@@ -15,7 +20,23 @@ class CommonQueryParams:
         if page_size and page_size > settings.MAX_PAGE_SIZE:
             page_size = settings.MAX_PAGE_SIZE
         self.page_size = page_size
-        if isinstance(page, int) or isinstance(page_size, int):
+        self.cursor = cursor
+        if cursor is not None:
+            # Keyset pagination, the cursor replaces the page offset
+            # and an empty cursor requests the first page. The values are checked
+            # against the order_by columns when the query is built, an
+            # InvalidCursor from there is also returned as a 400 by the app
+            try:
+                if cursor:
+                    decode_cursor(cursor)
+            except InvalidCursor:
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+                )
+            self.page_size = page_size or settings.DEFAULT_PAGE_SIZE
+            self.start = None
+            self.stop = self.page_size
+        elif isinstance(page, int) or isinstance(page_size, int):
             page = page or 0
             page_size = page_size or settings.DEFAULT_PAGE_SIZE
             self.start = page * page_size
@@ -2,10 +2,17 @@ from fastapi import Depends, HTTPException
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 from models import User
-from .current_user import current_user
+from utils.auth_cache import AuthUser, remember_user
+from .current_user import current_auth_user, load_user
 
 
-async def current_admin(user: User = Depends(current_user)):
+async def current_admin(auth_user: AuthUser = Depends(current_auth_user)) -> User:
+    # Users without access are rejected from the snapshot without loading them
+    if not auth_user.is_admin:
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Not authorized")
+    user = await load_user(auth_user.id)
+    # The snapshot may be stale in this process, the loaded user has the final say
     if not user.is_admin:
+        remember_user(user)
         raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Not authorized")
     return user
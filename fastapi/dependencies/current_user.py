@@ -1,22 +1,44 @@
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jwt import decode, PyJWTError
 
+from database import ModelLoader
 from models import User
-from utils.tokens import DECODE_ARGS, CREDENTIALS_EXCEPTION
+from utils.auth_cache import AuthUser, get_auth_user, remember_user, verify_token
+from utils.tokens import CREDENTIALS_EXCEPTION
+from .model_loader import model_loader
 
 
-async def current_user(
-    token: str = Depends(OAuth2PasswordBearer(tokenUrl="/oauth/login"))
-):
-    try:
-        payload = decode(token, **DECODE_ARGS)
-        user_id: str = payload.get("sub")
-        if not user_id:
-            raise CREDENTIALS_EXCEPTION
-    except PyJWTError:
-        raise CREDENTIALS_EXCEPTION
-    user = await User.get(user_id, True)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/oauth/login")
+
+
+async def load_user(user_id):
+    """
+    Load a user through the request's ModelLoader and the MODEL_CACHE, so a user
+    loaded earlier in the request or recently by this process is not queried again.
+    """
+    user = await User.get(user_id, True, cached=True)
     if user is None:
         raise CREDENTIALS_EXCEPTION
     return user
+
+
+async def current_user(
+    token: str = Depends(oauth2_scheme), _: ModelLoader = Depends(model_loader)
+):
+    payload = await verify_token(token)
+    user = await load_user(payload["sub"])
+    remember_user(user)
+    return user
+
+
+async def current_auth_user(
+    token: str = Depends(oauth2_scheme), _: ModelLoader = Depends(model_loader)
+) -> AuthUser:
+    """
+    The authorization fields of the current user, without loading the user when cached.
+    """
+    payload = await verify_token(token)
+    auth_user = get_auth_user(payload["sub"])
+    if auth_user is None:
+        auth_user = remember_user(await load_user(payload["sub"]))
+    return auth_user
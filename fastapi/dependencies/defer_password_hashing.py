@@ -0,0 +1,6 @@
+from database.types import defer_password_hashing as _defer_password_hashing
+
+
+async def defer_password_hashing():
+    # Must be async so it runs in the request's context before the body is validated
+    _defer_password_hashing()
@@ -0,0 +1,10 @@
+from database.loader import ModelLoader, set_loader
+
+
+async def model_loader():
+    loader = ModelLoader()
+    set_loader(loader)
+    try:
+        yield loader
+    finally:
+        loader.clear()
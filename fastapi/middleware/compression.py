@@ -0,0 +1,256 @@
+"""
+Middleware for compressing responses with brotli, zstd or gzip.
+
+The encoding is negotiated from Accept-Encoding, preferring br, then zstd,
+then gzip. brotli and zstandard are optional, without them installed gzip is
+used. Only the content types in COMPRESSION_LEVELS are compressed, each with
+its own level per encoding. When the load average per CPU reaches
+COMPRESSION_HIGH_LOAD the fastest level is used instead.
+
+Complete bodies of at least GZIP_THRESHOLD bytes are compressed in one go and
+the result is kept in an LRU keyed by the hash of the body, the encoding and
+the level, so repeated responses are only compressed once per level and a body
+compressed quickly under load isn't served once the load drops. Streaming
+bodies are compressed and flushed chunk by chunk.
+"""
+
+import hashlib
+import os
+import zlib
+from time import monotonic
+
+from app import settings
+from utils.lru import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ["CompressionMiddleware", "COMPRESSION_CACHE"]
+
+
+# Levels used while the CPU is busy
+FAST_LEVELS = {"br": 1, "zstd": 1, "gzip": 1}
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        # wbits 31 writes the gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+COMPRESSORS = {"gzip": _GzipCompressor}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _ZstdCompressor
+if brotli is not None:
+    COMPRESSORS["br"] = _BrotliCompressor
+
+# In order of preference
+ENCODINGS = [encoding for encoding in ("br", "zstd", "gzip") if encoding in COMPRESSORS]
+
+
+def _compress(encoding, level, data):
+    compressor = COMPRESSORS[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def negotiate(accept_encoding):
+    """
+    Return the preferred supported encoding allowed by an Accept-Encoding header or None.
+    """
+    allowed = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        allowed[name.strip().lower()] = quality
+    wildcard = allowed.get("*", 0.0)
+    for encoding in ENCODINGS:
+        if allowed.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def content_type_levels(content_type):
+    """
+    Return the levels for a content type from COMPRESSION_LEVELS or None if it
+    shouldn't be compressed, entries ending with / match the whole type.
+    """
+    content_type = content_type.split(";")[0].strip().lower()
+    levels = settings.COMPRESSION_LEVELS.get(content_type)
+    if levels is None:
+        levels = settings.COMPRESSION_LEVELS.get(content_type.split("/")[0] + "/")
+    return levels
+
+
+class _Load:
+    """
+    Samples the load average per CPU at most once a second.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.value = 0.0
+
+    def busy(self):
+        now = monotonic()
+        if now - self.checked > 1:
+            self.checked = now
+            try:
+                self.value = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except (AttributeError, OSError):
+                self.value = 0.0
+        return self.value >= settings.COMPRESSION_HIGH_LOAD
+
+
+LOAD = _Load()
+
+
+# Compressed bodies limited to COMPRESSION_CACHE_BYTES in total
+COMPRESSION_CACHE = LRUCache(settings.COMPRESSION_CACHE_BYTES, weigh=len)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=None):
+        self.app = app
+        self.minimum_size = (
+            settings.GZIP_THRESHOLD if minimum_size is None else minimum_size
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send, encoding, minimum_size):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.levels = None
+        self.compressor = None
+        # Passing the response through unchanged
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = {
+                name.lower(): value for name, value in message.get("headers", [])
+            }
+            if b"content-encoding" in headers:
+                self.passthrough = True
+            else:
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                self.levels = content_type_levels(content_type)
+                self.passthrough = self.levels is None
+            if self.passthrough:
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        level = self.levels.get(self.encoding, 6)
+        if LOAD.busy():
+            level = FAST_LEVELS[self.encoding]
+
+        if self.compressor is None and self.start is not None:
+            start = self.start
+            self.start = None
+            if not more_body:
+                # The whole body is known, compress it once or use the cached result
+                if len(body) < self.minimum_size:
+                    await self._send(start)
+                    await self._send(message)
+                    return
+                key = (hashlib.sha1(body).digest(), self.encoding, level)
+                compressed = COMPRESSION_CACHE.get(key)
+                if compressed is None:
+                    compressed = _compress(self.encoding, level, body)
+                    COMPRESSION_CACHE.set(key, compressed)
+                await self._send(self._headers(start, len(compressed)))
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            self.compressor = COMPRESSORS[self.encoding](level)
+            await self._send(self._headers(start, None))
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self._send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+    def _headers(self, start, length):
+        headers = [
+            (name, value)
+            for name, value in start.get("headers", [])
+            if name.lower() != b"content-length"
+        ]
+        if not any(
+            name.lower() == b"vary" and b"accept-encoding" in value.lower()
+            for name, value in headers
+        ):
+            headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**start, "headers": headers}
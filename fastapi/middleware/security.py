@@ -0,0 +1,44 @@
+"""
+Middleware for adding X-Frame-Options and other security headers to all responses.
+
+Implemented as a plain ASGI middleware that only rewrites the
+http.response.start message, so unlike BaseHTTPMiddleware responses are not
+copied through an extra task and memory stream, and streaming responses keep
+their backpressure.
+"""
+
+from app import settings
+
+__all__ = ["SecurityHeadersMiddleware"]
+
+
+class SecurityHeadersMiddleware:
+    """
+    Adds each header that the response doesn't already set.
+    The headers default to the SECURITY_HEADERS setting.
+    """
+
+    def __init__(self, app, headers=None):
+        self.app = app
+        if headers is None:
+            headers = settings.SECURITY_HEADERS
+        self.headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers.items()
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                present = {name.lower() for name, _ in headers}
+                missing = [item for item in self.headers if item[0] not in present]
+                if missing:
+                    message = {**message, "headers": [*headers, *missing]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,3 +1,5 @@
+from .job import Job
+from .revoked_token import RevokedToken
 from .user import User
 
-__all__ = ['User']
+__all__ = ['Job', 'RevokedToken', 'User']
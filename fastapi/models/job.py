@@ -0,0 +1,31 @@
+from datetime import datetime
+from enum import Enum
+
+from pydantic import Schema, constr
+
+from database.models import DbBaseModel
+from database.types import Json
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __str__(self):
+        return self.value
+
+
+class Job(DbBaseModel):
+    type: constr(max_length=63) = Schema(..., index=True)
+    payload: Json = {}
+    status: JobStatus = Schema(JobStatus.QUEUED, index=True)
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 1
+    error: str = None
+    run_at: datetime = Schema(None, index=True)
+    created: datetime = Schema(None, auto_now_add=True)
+    started: datetime = None
+    finished: datetime = None
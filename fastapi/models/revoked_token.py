@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from pydantic import Schema, constr
+
+from database.models import DbBaseModel
+
+
+class RevokedToken(DbBaseModel):
+    jti: constr(max_length=63) = Schema(..., unique=True)
+    expires: datetime = Schema(None, index=True)
+    revoked: datetime = Schema(None, auto_now_add=True)
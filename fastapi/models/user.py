@@ -4,6 +4,7 @@ from pydantic import EmailStr, Schema, constr
 
 from database.models import DbBaseModel
 from database.types import PasswordStr
+from utils.auth_cache import forget_user
 
 
 class User(DbBaseModel):
@@ -15,3 +16,45 @@ class User(DbBaseModel):
     is_staff: bool = Schema(False, read_only=True)
     is_admin: bool = Schema(False, read_only=True)
     joined: datetime = Schema(None, auto_now_add=True)
+
+    class Config:
+        # Cache lookups by id, the current_user dependency loads the user on every request
+        cache_ttl = 300
+
+    async def save(self, update_values=None, read_only=False, force_insert=False):
+        await super().save(update_values, read_only, force_insert)
+        forget_user(self.id)
+        return self
+
+    async def delete(self):
+        forget_user(self.id)
+        return await super().delete()
+
+    # The bulk writes bypass save() so they drop the auth snapshots themselves,
+    # snapshots in other processes expire after AUTH_USER_TTL seconds
+
+    @classmethod
+    async def bulk_update(cls, objs, read_only=False, batch_size=None):
+        objs = await super().bulk_update(list(objs), read_only, batch_size)
+        for obj in objs:
+            forget_user(obj.id)
+        return objs
+
+    @classmethod
+    async def bulk_upsert(
+        cls, objs, conflict=("id",), read_only=False, batch_size=None
+    ):
+        objs = await super().bulk_upsert(objs, conflict, read_only, batch_size)
+        for obj in objs:
+            forget_user(obj.id)
+        return objs
+
+    @classmethod
+    async def copy_from(cls, objs, read_only=False):
+        def forget(objs):
+            for obj in objs:
+                if obj.id is not None:
+                    forget_user(obj.id)
+                yield obj
+
+        return await super().copy_from(forget(objs), read_only)
@@ -1,2 +1,3 @@
 from .authorization import *
+from .jobs import *
 from .users import *
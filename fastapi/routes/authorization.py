@@ -10,7 +10,8 @@ from app import settings
 from app.asgi import app
 from dependencies import is_ajax
 from models import User
-from utils.password import check_password
+from utils.auth_cache import forget_token
+from utils.password import check_password_async
 from utils.tokens import create_token, revoke_token
 
 
@@ -40,11 +41,12 @@ async def authorization_code_access_token(form_data):
     pass
 
 
-@app.post("/oauth/revoke", response_model=Token)
+@app.post("/oauth/revoke")
 async def revoke_access_token(
     token: str = Depends(OAuth2PasswordBearer(tokenUrl="/oauth/login"))
 ):
-    revoke_token(token)
+    await revoke_token(token)
+    forget_token(token)
 
 
 @app.post("/oauth/implicit", response_model=Token)
@@ -60,7 +62,7 @@ async def password_access_token(
 ):
     # https://tools.ietf.org/html/rfc6749#section-4.3
     user = await User.get(User.c.email == form_data.username, True)
-    if not user or not check_password(form_data.password, user.password):
+    if not user or not await check_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
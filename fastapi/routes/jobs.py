@@ -0,0 +1,11 @@
+from fastapi import Depends
+
+from app.asgi import app
+from dependencies import current_staff
+from models import User
+from utils.jobs import JOBS
+
+
+@app.get("/jobs/stats")
+async def job_stats(_: User = Depends(current_staff)):
+    return await JOBS.stats()
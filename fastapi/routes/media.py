@@ -3,18 +3,26 @@ from typing import List
 from fastapi import Depends
 
 from app.asgi import app
+from database import ModelJSONResponse
 from dependencies import current_user, CommonQueryParams
 from models import Image, Video, Media, User
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 @app.get("/media", response_model=List[Media])
 async def get_media(
-    user: User = Depends(current_user), params: CommonQueryParams = Depends()
+    user: User = Depends(current_user),
+    params: CommonQueryParams = Depends(),
 ):
     media = await Media.union(
         (Image, Video),
         ((Image.c.user_id == user.id), (Video.c.user_id == user.id)),
         start=params.start,
         stop=params.stop,
+        cursor=params.cursor,
     )
-    return media
+    headers = {}
+    if params.cursor is not None and media and len(media) == params.stop:
+        headers[NEXT_CURSOR_HEADER] = Media.union_cursor(media[-1])
+    return ModelJSONResponse(media, headers=headers)
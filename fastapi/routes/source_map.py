@@ -1,17 +1,35 @@
 from fastapi import Depends, HTTPException
-from starlette.status import HTTP_501_NOT_IMPLEMENTED
+from pydantic import BaseModel
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_501_NOT_IMPLEMENTED
 
 from app import settings
 from app.asgi import app
 from dependencies import current_staff
 from models import User
-from utils.source_map import download_source_map
+from utils.source_map import download_source_map, symbolicate
 
 
-@app.get("/source-map/{filename}")
-async def source_map(filename, _: User = Depends(current_staff)):
+class StackTrace(BaseModel):
+    stack: str
+
+
+def _check_configured():
     if not settings.SOURCEMAP_BUCKET:
         raise HTTPException(
             status_code=HTTP_501_NOT_IMPLEMENTED, detail="Uploading is unavailable"
         )
-    return await download_source_map(filename)
+
+
+@app.get("/source-map/{filename}")
+async def source_map(filename, _: User = Depends(current_staff)):
+    _check_configured()
+    text = await download_source_map(filename)
+    if text is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Not found")
+    return text
+
+
+@app.post("/source-map/symbolicate")
+async def symbolicate_stack(trace: StackTrace, _: User = Depends(current_staff)):
+    _check_configured()
+    return await symbolicate(trace.stack)
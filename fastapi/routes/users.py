@@ -1,10 +1,11 @@
 from datetime import timedelta
 
-from fastapi import BackgroundTasks, Depends, HTTPException
+from fastapi import Depends, HTTPException
 from starlette.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
 
 from app.asgi import app
-from dependencies import current_user
+from database import model_response
+from dependencies import current_user, defer_password_hashing
 from models import User
 from utils.email import send_email
 from utils.tokens import create_token
@@ -25,31 +26,44 @@ async def check_availability(username: str = None, email: str = None):
 
 
 @app.get("/me", response_model=User.response_model())
+@model_response
 async def get_current_user(user: User = Depends(current_user)):
     return user
 
 
-@app.put("/me", response_model=User.response_model())
+@app.put(
+    "/me",
+    response_model=User.response_model(),
+    dependencies=[Depends(defer_password_hashing)],
+)
+@model_response
 async def update_current_user(values: dict, user: User = Depends(current_user)):
     return await user.save(values)
 
 
 @app.post(
-    "/register", response_model=User.response_model(), status_code=HTTP_201_CREATED
+    "/register",
+    response_model=User.response_model(),
+    status_code=HTTP_201_CREATED,
+    dependencies=[Depends(defer_password_hashing)],
 )
-async def register_user(user: User, background_tasks: BackgroundTasks):
+async def register_user(user: User):
     await user.save()
-    background_tasks.add_task(
-        send_email,
-        "Welcome {{user.first_name}}",
-        "welcome",
-        {
-            "user": user,
-            "confirm_token": create_token(
-                data={"sub": str(user.id)}, expires_delta=timedelta(days=1)
-            ),
-        },
-    )
+    # The user is already saved, so a failed welcome email can't fail the request
+    try:
+        send_email(
+            user.email,
+            "Welcome {{user.first_name}}",
+            "welcome",
+            {
+                "user": user,
+                "confirm_token": create_token(
+                    data={"sub": str(user.id)}, expires_delta=timedelta(days=1)
+                ),
+            },
+        )
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"Warning: failed to send the welcome email to {user.email}: {e!r}")
     return user
 
 
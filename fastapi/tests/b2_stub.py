@@ -0,0 +1,99 @@
+"""
+A local stand-in for the B2 API, served with aiohttp on a random port.
+"""
+
+import hashlib
+from collections import Counter, deque
+
+from aiohttp import web
+
+
+class B2Stub:
+    def __init__(self):
+        self.url = None
+        self.calls = Counter()
+        # Files uploaded by name
+        self.files = {}
+        self.hidden = []
+        # Statuses to answer uploads with before succeeding, in order
+        self.upload_statuses = deque()
+        # Upload URLs used for each upload
+        self.upload_urls = []
+        self.tokens = 0
+        self.upload_url_count = 0
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/b2api/v2/b2_authorize_account", self.authorize)
+        app.router.add_post("/b2api/v2/{endpoint}", self.api)
+        app.router.add_post("/upload/{n}", self.upload)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def token(self):
+        return f"token{self.tokens}"
+
+    async def authorize(self, _request):
+        self.calls["b2_authorize_account"] += 1
+        self.tokens += 1
+        return web.json_response(
+            {
+                "apiUrl": self.url,
+                "downloadUrl": self.url,
+                "authorizationToken": self.token(),
+                "accountId": "account",
+            }
+        )
+
+    async def api(self, request):
+        endpoint = request.match_info["endpoint"]
+        self.calls[endpoint] += 1
+        if request.headers.get("Authorization") != self.token():
+            return web.json_response({"code": "expired_auth_token"}, status=401)
+        data = await request.json()
+        if endpoint == "b2_list_buckets":
+            return web.json_response(
+                {"buckets": [{"bucketName": "media", "bucketId": "bucket"}]}
+            )
+        if endpoint == "b2_get_upload_url":
+            self.upload_url_count += 1
+            n = self.upload_url_count
+            return web.json_response(
+                {
+                    "bucketId": data["bucketId"],
+                    "uploadUrl": f"{self.url}/upload/{n}",
+                    "authorizationToken": f"upload{n}",
+                }
+            )
+        if endpoint == "b2_hide_file":
+            if data["fileName"].startswith("missing/"):
+                return web.json_response({"code": "no_such_file"}, status=404)
+            self.hidden.append(data["fileName"])
+            return web.json_response({"fileName": data["fileName"]})
+        return web.json_response({"code": "bad_request"}, status=404)
+
+    async def upload(self, request):
+        n = request.match_info["n"]
+        self.upload_urls.append(n)
+        body = await request.read()
+        if request.headers.get("Authorization") != f"upload{n}":
+            return web.json_response({"code": "bad_auth_token"}, status=401)
+        if self.upload_statuses:
+            return web.json_response(
+                {"code": "failed"}, status=self.upload_statuses.popleft()
+            )
+        data, sha1 = body[:-40], body[-40:].decode("ascii")
+        if hashlib.sha1(data).hexdigest() != sha1:
+            return web.json_response({"code": "bad_sha1"}, status=400)
+        name = request.headers["X-Bz-File-Name"]
+        self.files[name] = data
+        return web.json_response({"fileName": name, "contentSha1": sha1})
@@ -0,0 +1,22 @@
+"""
+Tests run from the fastapi directory with `python -m pytest`, they don't need a
+database, Redis or network access.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("APP_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("APP_DB_USERNAME", "test")
+os.environ.setdefault("APP_DB_PASSWORD", "test")
+
+# pylint: disable=wrong-import-position
+import models
+from database import DbBaseModel, generate_table, metadata
+
+for name in models.__all__:
+    model = getattr(models, name)
+    if hasattr(model, "__name__") and issubclass(model, DbBaseModel):
+        generate_table(model, metadata)
@@ -0,0 +1,70 @@
+"""
+A local SMTP sink served from a thread on a random port.
+"""
+
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class SmtpStub:
+    def __init__(self, drop_after=None, reject=()):
+        # Messages received, as email.message.Message
+        self.messages = []
+        self.connections = 0
+        # Close each connection after this many messages
+        self.drop_after = drop_after
+        # Recipients answered with 550
+        self.reject = set(reject)
+        self._server = None
+        self.port = None
+
+    def start(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                stub.connections += 1
+                received = 0
+                self.reply("220 stub ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode("ascii").strip().upper()
+                    if command.startswith(("EHLO", "HELO")):
+                        self.reply("250 stub")
+                    elif command.startswith("RCPT"):
+                        address = command.partition(":")[2].strip("<> ").lower()
+                        self.reply(
+                            "550 rejected" if address in stub.reject else "250 ok"
+                        )
+                    elif command == "DATA":
+                        self.reply("354 go ahead")
+                        data = b""
+                        for line in iter(self.rfile.readline, b".\r\n"):
+                            data += line
+                        stub.messages.append(message_from_bytes(data))
+                        received += 1
+                        self.reply("250 queued")
+                        if stub.drop_after and received >= stub.drop_after:
+                            return
+                    elif command == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        # MAIL, RSET and NOOP
+                        self.reply("250 ok")
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from database import DbBaseModel
+from dependencies import current_admin, current_staff
+from models import User
+from utils.auth_cache import AUTH_USER_CACHE, get_auth_user, remember_user
+
+
+def make_user(id_, is_staff=False, is_admin=False):
+    return User.construct(
+        {
+            "id": id_,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": f"user{id_}@example.com",
+            "is_confirmed": True,
+            "is_staff": is_staff,
+            "is_admin": is_admin,
+            "joined": None,
+        },
+        set(),
+    )
+
+
+class FakeUsers(dict):
+    def __init__(self):
+        super().__init__()
+        self.loads = []
+
+    async def get(self, clause_or_row_id, parse=True, cached=False):
+        self.loads.append(clause_or_row_id)
+        return super().get(clause_or_row_id)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = FakeUsers()
+    monkeypatch.setattr(User, "get", users.get)
+    AUTH_USER_CACHE.clear()
+    return users
+
+
+def test_staff_and_admin_return_the_user(users):
+    users[1] = make_user(1, is_staff=True, is_admin=True)
+    auth_user = remember_user(users[1])
+    for dependency in (current_staff, current_admin):
+        user = asyncio.run(dependency(auth_user))
+        assert isinstance(user, User) and user.id == 1
+
+
+def test_rejected_from_the_snapshot_without_loading(users):
+    auth_user = remember_user(make_user(2))
+    for dependency in (current_staff, current_admin):
+        with pytest.raises(HTTPException) as info:
+            asyncio.run(dependency(auth_user))
+        assert info.value.status_code == 401
+    assert not users.loads
+
+
+def test_bulk_writes_forget_snapshots(monkeypatch, users):
+    async def bulk(cls, objs, *args, **kwargs):
+        return list(objs)
+
+    async def copy_from(cls, objs, read_only=False):
+        return len(list(objs))
+
+    monkeypatch.setattr(DbBaseModel, "bulk_update", classmethod(bulk))
+    monkeypatch.setattr(DbBaseModel, "bulk_upsert", classmethod(bulk))
+    monkeypatch.setattr(DbBaseModel, "copy_from", classmethod(copy_from))
+    for method in (User.bulk_update, User.bulk_upsert, User.copy_from):
+        user = make_user(3, is_staff=True)
+        remember_user(user)
+        asyncio.run(method([user]))
+        assert get_auth_user(3) is None
+
+
+def test_stale_snapshot_is_checked_against_the_loaded_user(users):
+    # Demoted in another process, this process still has the old snapshot
+    auth_user = remember_user(make_user(4, is_staff=True, is_admin=True))
+    users[4] = make_user(4)
+    for dependency in (current_staff, current_admin):
+        with pytest.raises(HTTPException) as info:
+            asyncio.run(dependency(auth_user))
+        assert info.value.status_code == 401
+    # The snapshot is refreshed from the loaded user
+    assert not get_auth_user(4).is_staff
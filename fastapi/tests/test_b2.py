@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app import settings
+from tests.b2_stub import B2Stub
+from utils import uploads
+from utils.b2 import B2_AUTH, BUCKET_ID_CACHE, UPLOAD_URLS, b2_authorize_account
+from utils.http import HTTP_CLIENT, http_session
+
+
+@pytest.fixture
+def b2_settings(monkeypatch):
+    monkeypatch.setenv("B2_APPLICATION_KEY_ID", "key-id")
+    monkeypatch.setenv("B2_APPLICATION_KEY", "key")
+    monkeypatch.setattr(settings, "MEDIA_BUCKET", "media")
+    monkeypatch.setattr(settings, "MEDIA_BUCKET_PROVIDER", "b2")
+    monkeypatch.setattr(settings, "B2_UPLOAD_URL_POOL_SIZE", 1)
+    B2_AUTH.clear()
+    BUCKET_ID_CACHE.clear()
+    UPLOAD_URLS.clear()
+    yield
+    B2_AUTH.clear()
+    UPLOAD_URLS.clear()
+
+
+def run_with_stub(monkeypatch, scenario):
+    async def main():
+        stub = await B2Stub().start()
+        monkeypatch.setattr(settings, "B2_API_URL", stub.url)
+        try:
+            await scenario(stub)
+        finally:
+            await HTTP_CLIENT.stop()
+            await stub.stop()
+        return stub
+
+    return asyncio.run(main())
+
+
+def write_file(tmp_path, data):
+    path = tmp_path / "media.bin"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_authorization_is_cached_and_refreshed_on_401(monkeypatch, b2_settings):
+    async def scenario(stub):
+        session = http_session()
+        first = await b2_authorize_account(session)
+        assert await b2_authorize_account(session) is first
+        assert stub.calls["b2_authorize_account"] == 1
+        # The token expired on the server, the next call authorizes again and retries
+        stub.tokens += 1
+        await uploads.b2_get_bucket_id(session, first, "media")
+        assert stub.calls["b2_authorize_account"] == 2
+
+    run_with_stub(monkeypatch, scenario)
+
+
+def test_authorization_is_shared_and_refreshed_early(monkeypatch, b2_settings):
+    async def scenario(stub):
+        session = http_session()
+        results = await asyncio.gather(
+            *[b2_authorize_account(session) for _ in range(5)]
+        )
+        assert stub.calls["b2_authorize_account"] == 1
+        assert all(auth is results[0] for auth in results)
+        # Inside the refresh margin the cached token is used while a new one is fetched
+        B2_AUTH.refresh_at = 0
+        assert await b2_authorize_account(session) is results[0]
+        await B2_AUTH._task
+        assert stub.calls["b2_authorize_account"] == 2
+        refreshed = await b2_authorize_account(session)
+        assert refreshed["authorizationToken"] != results[0]["authorizationToken"]
+        assert stub.calls["b2_authorize_account"] == 2
+
+    run_with_stub(monkeypatch, scenario)
+
+
+def test_successful_upload_reuses_the_upload_url(monkeypatch, b2_settings, tmp_path):
+    filename = write_file(tmp_path, b"x" * 1000)
+    # Only released URLs go back into the pool
+    monkeypatch.setattr(UPLOAD_URLS, "_refill", lambda session, bucket: None)
+
+    async def scenario(stub):
+        await uploads._upload_media(filename, "a.bin")
+        await uploads._upload_media(filename, "b.bin")
+        assert stub.files["a.bin"] == b"x" * 1000
+        assert stub.upload_urls[0] == stub.upload_urls[1]
+        # The session keeps its connections alive between calls
+        assert HTTP_CLIENT.connections_reused
+
+    run_with_stub(monkeypatch, scenario)
+
+
+@pytest.mark.parametrize("status", [500, 408, 503])
+def test_failed_upload_url_is_never_reused(monkeypatch, b2_settings, tmp_path, status):
+    filename = write_file(tmp_path, b"x" * 1000)
+    monkeypatch.setattr(UPLOAD_URLS, "_refill", lambda session, bucket: None)
+
+    async def scenario(stub):
+        stub.upload_statuses.append(status)
+        try:
+            await uploads._upload_media(filename, "a.bin")
+        except Exception:  # pylint: disable=broad-except
+            assert status != 503
+        failed = stub.upload_urls[0]
+        await uploads._upload_media(filename, "b.bin")
+        assert stub.upload_urls[-1] != failed
+        idle = UPLOAD_URLS.idle["media"]
+        assert all(not url["uploadUrl"].endswith(f"/{failed}") for url in idle)
+
+    run_with_stub(monkeypatch, scenario)
+
+
+def test_bulk_delete_reports_each_key(monkeypatch, b2_settings):
+    async def scenario(stub):
+        report = await uploads.delete_media_bulk(
+            [(1234567, "jpeg", ["150x150", "450"])]
+        )
+        assert stub.hidden == list(report)
+        assert all(error is None for error in report.values())
+        assert stub.calls["b2_authorize_account"] == 1
+
+    run_with_stub(monkeypatch, scenario)
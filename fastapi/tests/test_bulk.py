@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+from datetime import datetime
+
+import pytest
+
+from models import User
+
+db_models = importlib.import_module("database.models")
+
+
+class FakeDatabase:
+    """
+    Answers INSERT ... RETURNING with one row per VALUES row, in reverse order.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    async def fetch_all(self, query):
+        self.queries.append(query)
+        rows = []
+        for i, values in enumerate(query.parameters):
+            id_ = values.get("id") or 1000 + i
+            rows.append(
+                {
+                    "id": id_,
+                    "is_confirmed": False,
+                    "is_staff": False,
+                    "is_admin": False,
+                    "joined": datetime(2020, 1, 1, 0, 0, id_ % 60),
+                }
+            )
+        return list(reversed(rows))
+
+
+def make_user(id_, email):
+    return User.construct(
+        {
+            "id": id_,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": email,
+            "password": "x" * 100,
+            "joined": None,
+        },
+        set(),
+    )
+
+
+def test_bulk_upsert_matches_returned_rows_by_key(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db_models, "database", fake)
+    users = [make_user(i, f"user{i}@example.com") for i in (1, 2, 3)]
+    asyncio.run(User.bulk_upsert(users))
+    assert len(fake.queries) == 1
+    for user in users:
+        assert user.joined.second == user.id
+
+
+def test_bulk_upsert_rejects_duplicate_keys(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db_models, "database", fake)
+    users = [make_user(1, "a@example.com"), make_user(1, "b@example.com")]
+    with pytest.raises(ValueError):
+        asyncio.run(User.bulk_upsert(users))
+    users = [make_user(1, "a@example.com"), make_user(2, "a@example.com")]
+    with pytest.raises(ValueError):
+        asyncio.run(User.bulk_upsert(users, conflict=("email",)))
+    assert not fake.queries
+
+
+def test_bulk_upsert_new_rows_without_keys(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db_models, "database", fake)
+    users = [make_user(None, f"new{i}@example.com") for i in range(3)]
+    asyncio.run(User.bulk_upsert(users))
+    assert sorted(user.id for user in users) == [1000, 1001, 1002]
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from app import settings
+from utils import uploads
+from utils.http import HTTP_CLIENT
+
+
+class StorageStub:
+    """
+    A local stand-in for BunnyCDN storage deletes that fails the keys in failing.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.deleted = []
+        self.running = 0
+        self.most_running = 0
+
+    async def delete(self, request):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            key = request.match_info["key"]
+            if key in self.failing:
+                return web.Response(status=500, text="storage error")
+            self.deleted.append(key)
+            return web.json_response({"HttpCode": 200})
+        finally:
+            self.running -= 1
+
+
+def run_with_stub(monkeypatch, stub, scenario):
+    async def main():
+        app = web.Application()
+        app.router.add_delete("/media/{key:.+}", stub.delete)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(
+            settings, "BUNNYCDN_STORAGE_URL", f"http://127.0.0.1:{port}"
+        )
+        try:
+            await scenario()
+        finally:
+            await HTTP_CLIENT.stop()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def bunny_settings(monkeypatch):
+    monkeypatch.setenv("BUNNYCDN_ACCESS_KEY", "key")
+    monkeypatch.setenv("BUNNYCDN_STORAGE_ACCESS_KEY", "storage-key")
+    monkeypatch.setattr(settings, "MEDIA_BUCKET", "media")
+    monkeypatch.setattr(settings, "MEDIA_BUCKET_PROVIDER", "bunnycdn")
+    monkeypatch.setattr(settings, "DELETE_CONCURRENCY", 2)
+
+
+def test_bulk_delete_is_bounded_and_reports_failures(monkeypatch):
+    items = [(id_, ".jpeg", ["150x150", "450"]) for id_ in range(1234560, 1234564)]
+    keys = [
+        uploads._rendition_key(size, str(id_), ext)
+        for id_, ext, sizes in items
+        for size in sizes
+    ]
+    stub = StorageStub(failing=[keys[3]])
+
+    async def scenario():
+        report = await uploads.delete_media_bulk(items)
+        assert list(report) == keys
+        assert report[keys[3]] is not None
+        assert all(report[key] is None for key in keys if key != keys[3])
+
+    run_with_stub(monkeypatch, stub, scenario)
+    assert sorted(stub.deleted) == sorted(key for key in keys if key != keys[3])
+    assert stub.most_running == 2
+
+
+def test_delete_media_raises_with_the_report(monkeypatch):
+    stub = StorageStub(failing=[uploads._rendition_key("450", "1234567", ".jpeg")])
+
+    async def scenario():
+        with pytest.raises(uploads.MediaDeleteError):
+            await uploads.delete_media(["150x150", "450"], 1234567, ".jpeg")
+
+    run_with_stub(monkeypatch, stub, scenario)
+    assert stub.deleted == [uploads._rendition_key("150x150", "1234567", ".jpeg")]
+
+
+def test_bulk_delete_job_raises_with_the_report(monkeypatch):
+    key = uploads._rendition_key("450", "1234567", ".jpeg")
+    stub = StorageStub(failing=[key])
+    handler, _ = uploads.JOBS.handlers["delete_media_bulk"]
+
+    async def scenario():
+        # Jobs get their arguments back from JSON, so items are lists
+        with pytest.raises(uploads.MediaDeleteError) as info:
+            await handler([[1234567, ".jpeg", ["150x150", "450"]]])
+        assert info.value.report[key] is not None
+
+    run_with_stub(monkeypatch, stub, scenario)
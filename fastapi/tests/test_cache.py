@@ -0,0 +1,95 @@
+import asyncio
+import json
+from typing import Dict, List
+
+import pytest
+from pydantic import Schema
+
+from database import DbBaseModel, PasswordStr, generate_table, metadata
+from database.cache import ModelCache
+from utils.password import hash_password
+
+HASHED = hash_password("secret")
+
+
+class CachedModel(DbBaseModel):
+    name: str
+    tags: List[str] = []
+    settings: Dict[str, str] = {}
+    password: PasswordStr = Schema(..., write_only=True)
+
+    class Config:
+        cache_ttl = 60
+
+
+class PublicModel(DbBaseModel):
+    name: str
+
+    class Config:
+        cache_ttl = 60
+
+
+generate_table(CachedModel, metadata)
+generate_table(PublicModel, metadata)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, expire=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def cache():
+    cache = ModelCache()
+    cache.redis = FakeRedis()
+    return cache
+
+
+def make_model():
+    return CachedModel.construct(
+        {
+            "id": 1,
+            "name": "cached",
+            "tags": ["a"],
+            "settings": {"theme": "dark"},
+            "password": HASHED,
+        },
+        {"id", "name", "tags", "settings", "password"},
+    )
+
+
+def test_hits_are_deep_copies(cache):
+    asyncio.run(cache.set(make_model()))
+    obj = asyncio.run(cache.get(CachedModel, 1))
+    obj.tags.append("b")
+    obj.settings["theme"] = "light"
+    obj = asyncio.run(cache.get(CachedModel, 1))
+    assert obj.tags == ["a"]
+    assert obj.settings == {"theme": "dark"}
+
+
+def test_models_with_secrets_are_only_cached_in_process(cache):
+    asyncio.run(cache.set(make_model()))
+    assert not cache.redis.data
+    obj = asyncio.run(cache.get(CachedModel, 1))
+    # Hits are complete, so they can still be assigned and saved
+    assert obj.password == HASHED
+    obj.assign(name="renamed")
+    assert obj.name == "renamed"
+
+
+def test_models_without_secrets_are_shared_through_redis(cache):
+    obj = PublicModel.construct({"id": 1, "name": "public"}, {"id", "name"})
+    asyncio.run(cache.set(obj))
+    assert json.loads(cache.redis.data["model:public_model:1"])["name"] == "public"
+    cache.local.clear()
+    assert asyncio.run(cache.get(PublicModel, 1)) == obj
@@ -0,0 +1,93 @@
+import asyncio
+import gzip
+
+import pytest
+
+from middleware import compression
+from middleware.compression import COMPRESSION_CACHE, CompressionMiddleware
+
+BODY = b'{"items": [' + b", ".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+
+
+def make_app(chunks):
+    async def app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        for index, chunk in enumerate(chunks):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": index < len(chunks) - 1,
+                }
+            )
+
+    return app
+
+
+def request(app, accept_encoding="gzip"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, None, send))
+    headers = dict(messages[0]["headers"])
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+@pytest.fixture(autouse=True)
+def idle(monkeypatch):
+    COMPRESSION_CACHE.clear()
+    monkeypatch.setattr(compression.LOAD, "busy", lambda: False)
+    yield
+    COMPRESSION_CACHE.clear()
+
+
+def test_negotiate():
+    assert compression.negotiate("gzip;q=0, identity") is None
+    assert compression.negotiate("gzip, deflate") == "gzip"
+    assert compression.negotiate("*") == compression.ENCODINGS[0]
+
+
+def test_gzip_body_is_compressed_and_cached():
+    headers, body = request(make_app([BODY]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(body)).encode()
+    assert gzip.decompress(body) == BODY
+    hits = COMPRESSION_CACHE.hits
+    assert request(make_app([BODY]))[1] == body
+    assert COMPRESSION_CACHE.hits == hits + 1
+
+
+def test_cache_is_keyed_by_level(monkeypatch):
+    _, normal = request(make_app([BODY]))
+    monkeypatch.setattr(compression.LOAD, "busy", lambda: True)
+    _, fast = request(make_app([BODY]))
+    # The body compressed at the busy level is kept apart from the normal one
+    assert COMPRESSION_CACHE.stats()["entries"] == 2
+    assert gzip.decompress(fast) == BODY
+    monkeypatch.setattr(compression.LOAD, "busy", lambda: False)
+    assert request(make_app([BODY]))[1] == normal
+
+
+def test_streaming_body():
+    headers, body = request(make_app([BODY[:500], BODY[500:]]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert gzip.decompress(body) == BODY
+
+
+def test_small_and_unlisted_bodies_pass_through():
+    headers, body = request(make_app([b"{}"]))
+    assert b"content-encoding" not in headers
+    assert body == b"{}"
@@ -0,0 +1,81 @@
+import asyncio
+import importlib
+from typing import Set
+
+import pytest
+
+from database import DbBaseModel, HStore, Json, generate_table, metadata
+
+copy = importlib.import_module("database.copy")
+
+
+class CopyRow(DbBaseModel):
+    tags: Set[str] = set()
+    attrs: HStore = {}
+    data: Json = None
+
+
+generate_table(CopyRow, metadata)
+
+
+class FakeRawConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.records = None
+
+    async def set_builtin_type_codec(self, typename, codec_name):
+        self.calls.append(("set", typename, codec_name))
+
+    async def reset_type_codec(self, typename):
+        self.calls.append(("reset", typename))
+
+    async def copy_records_to_table(self, table_name, records, columns):
+        if self.fail:
+            raise ConnectionError("copy failed")
+        self.records = [dict(zip(columns, record)) for record in records]
+        return f"COPY {len(self.records)}"
+
+
+class FakeDatabase:
+    def __init__(self, raw_connection):
+        self.raw_connection = raw_connection
+
+    def connection(self):
+        database = self
+
+        class Connection:
+            raw_connection = database.raw_connection
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+        return Connection()
+
+
+def test_converts_values(monkeypatch):
+    raw = FakeRawConnection()
+    monkeypatch.setattr(copy, "database", FakeDatabase(raw))
+    rows = [
+        CopyRow(tags={"a"}, attrs={"k": "v"}, data={"x": 1}),
+        CopyRow(tags=set(), attrs={}, data=[1, 2]),
+    ]
+    assert asyncio.run(copy.copy_models(CopyRow, rows)) == 2
+    assert raw.records[0]["tags"] == ["a"]
+    assert raw.records[0]["attrs"] == {"k": "v"}
+    assert raw.records[0]["data"] == '{"x": 1}'
+    assert raw.records[1]["data"] == "[1, 2]"
+
+
+def test_resets_hstore_codec_after_failed_copy(monkeypatch):
+    raw = FakeRawConnection(fail=True)
+    monkeypatch.setattr(copy, "database", FakeDatabase(raw))
+    with pytest.raises(ConnectionError):
+        asyncio.run(copy.copy_models(CopyRow, [CopyRow(attrs={"k": "v"})]))
+    assert raw.calls == [
+        ("set", "hstore", "pg_contrib.hstore"),
+        ("reset", "hstore"),
+    ]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app import settings
+from tests.smtp_stub import SmtpStub
+from utils import email
+from utils.email import Mailer, send_email
+
+
+@pytest.fixture
+def smtp(monkeypatch, request):
+    stub = SmtpStub(**getattr(request, "param", {})).start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", stub.port)
+    monkeypatch.setattr(settings, "SMTP_TLS", False)
+    monkeypatch.setattr(settings, "SMTP_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "EMAIL_BATCH_SIZE", 10)
+    monkeypatch.setattr(settings, "EMAIL_FROM_EMAIL", "noreply@example.com")
+    monkeypatch.setattr(email, "MAILER", Mailer())
+    yield stub
+    stub.stop()
+
+
+def send_all(recipients):
+    async def main():
+        futures = [
+            send_email(to, "Hello {{ name }}", "<p>Hi {{ name }}</p>", {"name": to})
+            for to in recipients
+        ]
+        try:
+            return await asyncio.gather(*futures)
+        finally:
+            await email.MAILER.stop()
+
+    return asyncio.run(main())
+
+
+def test_outbox_sends_batches_over_pooled_connections(smtp):
+    recipients = [f"user{i}@example.com" for i in range(25)]
+    assert send_all(recipients) == [None] * 25
+    assert sorted(m["To"] for m in smtp.messages) == sorted(recipients)
+    assert smtp.messages[0]["Subject"] == f"Hello {smtp.messages[0]['To']}"
+    # Each pooled connection stays open between batches
+    assert smtp.connections <= settings.SMTP_POOL_SIZE
+    stats = email.MAILER.stats()
+    assert stats["sent"] == 25 and stats["failed"] == 0
+    assert stats["batches"] < 25
+
+
+@pytest.mark.parametrize("smtp", [{"drop_after": 1}], indirect=True)
+def test_dropped_connections_are_reopened(smtp):
+    recipients = [f"user{i}@example.com" for i in range(5)]
+    assert send_all(recipients) == [None] * 5
+    assert len(smtp.messages) == 5
+    assert smtp.connections >= 5
+
+
+@pytest.mark.parametrize("smtp", [{"reject": ["bad@example.com"]}], indirect=True)
+def test_rejected_message_resolves_to_its_error(smtp):
+    errors = send_all(["good@example.com", "bad@example.com", "other@example.com"])
+    assert errors[0] is None and errors[2] is None
+    assert errors[1] is not None
+    assert sorted(m["To"] for m in smtp.messages) == [
+        "good@example.com",
+        "other@example.com",
+    ]
+    assert email.MAILER.stats()["failed"] == 1
+
+
+def test_idle_connections_are_closed(monkeypatch, smtp):
+    monkeypatch.setattr(settings, "SMTP_IDLE_TIMEOUT", 0.05)
+
+    async def main():
+        await send_email("user@example.com", "Hello", "<p>Hi</p>")
+        await asyncio.sleep(0.3)
+        connections = [c.smtp for c in email.MAILER.connections]
+        await email.MAILER.stop()
+        return connections
+
+    assert asyncio.run(main()) == [None] * settings.SMTP_POOL_SIZE
+    assert len(smtp.messages) == 1
+
+
+def test_not_configured_without_a_from_address(monkeypatch, smtp):
+    monkeypatch.setattr(settings, "EMAIL_FROM_EMAIL", None)
+    assert send_email("user@example.com", "Hello", "<p>Hi</p>") is None
+    assert email.MAILER.outbox is None
@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import List, Set
+
+import pytest
+from pydantic import ValidationError, constr, validator
+
+from database import DbBaseModel, Json, generate_table, metadata
+from database.hydration import get_plan, hydrate_rows
+
+
+class HydratedRow(DbBaseModel):
+    name: constr(max_length=8)
+    views: int = 0
+    created: datetime = None
+    labels: List[str] = []
+    tags: Set[str] = set()
+    data: Json = None
+    title: str = None
+
+    @validator("title")
+    def strip_title(cls, value):  # pylint: disable=no-self-argument
+        return value.strip() if value else value
+
+
+generate_table(HydratedRow, metadata)
+
+
+def row(**values):
+    return {
+        "id": 1,
+        "name": "row",
+        "views": 1,
+        "created": datetime(2020, 1, 1),
+        "labels": ["a"],
+        "tags": ["b", "b"],
+        "data": {"x": 1},
+        "title": " Title ",
+        **values,
+    }
+
+
+def test_plan_trusts_only_database_typed_fields():
+    trusted, validated = get_plan(HydratedRow, tuple(row().keys()))
+    # Constrained strings are trusted, their VARCHAR column already limits the length
+    assert {name for _, name in trusted} == {
+        "id",
+        "name",
+        "views",
+        "created",
+        "labels",
+        "data",
+    }
+    assert {field.name for _, field in validated} == {"tags", "title"}
+
+
+def test_matches_full_validation():
+    rows = [row(), row(views=2, title=None)]
+    assert hydrate_rows(HydratedRow, rows) == [HydratedRow.parse_row(r) for r in rows]
+    obj = hydrate_rows(HydratedRow, rows)[0]
+    assert obj.tags == {"b"}
+    assert obj.title == "Title"
+    assert obj.labels is rows[0]["labels"]
+
+
+def test_missing_columns_use_defaults():
+    data = row()
+    del data["views"]
+    (obj,) = hydrate_rows(HydratedRow, [data])
+    assert obj.views == 0
+    assert "views" not in obj.__fields_set__
+
+
+def test_invalid_rows_raise_validation_error():
+    with pytest.raises(ValidationError):
+        hydrate_rows(HydratedRow, [row(), row(tags=None)])
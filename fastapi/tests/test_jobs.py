@@ -0,0 +1,158 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app import settings
+from models import Job
+from models.job import JobStatus
+from utils import jobs
+from utils.jobs import JobQueue
+
+
+class FakeDatabase:
+    """
+    Compiles every query for postgres and answers fetch_all() with the queued rows.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    def _compile(self, query):
+        compiled = query.compile(dialect=postgresql.dialect())
+        self.queries.append((str(compiled), compiled.construct_params()))
+
+    async def execute(self, query):
+        self._compile(query)
+
+    async def fetch_all(self, query):
+        self._compile(query)
+        rows, self.rows = self.rows, []
+        return rows
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(jobs, "database", database)
+    return database
+
+
+def make_job(id_=1, attempts=1, max_attempts=3):
+    now = datetime.utcnow()
+    return Job.construct(
+        {
+            "id": id_,
+            "type": "test",
+            "payload": {"args": [id_], "kwargs": {}},
+            "status": JobStatus.RUNNING,
+            "priority": 0,
+            "attempts": attempts,
+            "max_attempts": max_attempts,
+            "error": None,
+            "run_at": now,
+            "created": now,
+            "started": now,
+            "finished": None,
+        },
+        set(),
+    )
+
+
+def test_claim_skips_locked_jobs_and_bounds_stale_attempts(database):
+    database.rows = [make_job().dict()]
+    (job,) = asyncio.run(JobQueue().claim("test", 3))
+    assert job.id == 1
+    (fail, fail_params), (claim, claim_params) = database.queries
+    # Stale jobs out of attempts are failed instead of claimed again
+    assert fail.startswith("UPDATE job SET")
+    assert "job.attempts >= job.max_attempts" in fail
+    assert fail_params["status"] == JobStatus.FAILED
+    assert "FOR UPDATE SKIP LOCKED" in claim
+    assert "job.attempts < job.max_attempts" in claim
+    assert "ORDER BY job.priority DESC, job.run_at" in claim
+    assert claim_params["status"] == JobStatus.RUNNING
+    assert 3 in claim_params.values()
+
+
+def test_failed_job_is_retried_with_backoff(database):
+    job = make_job(attempts=2)
+    before = datetime.utcnow()
+    asyncio.run(JobQueue()._finish(job, "boom"))
+    ((update, params),) = database.queries
+    # Only the worker that still owns the attempt updates the job
+    assert "job.attempts = %(attempts_1)s" in update
+    assert params["attempts_1"] == 2
+    assert params["status"] == JobStatus.QUEUED
+    delay = params["run_at"] - before
+    assert timedelta(seconds=settings.JOB_RETRY_DELAY * 2) <= delay
+    assert delay < timedelta(seconds=settings.JOB_RETRY_DELAY * 2 + 5)
+
+
+def test_last_attempt_fails_the_job(database):
+    queue = JobQueue()
+    asyncio.run(queue._finish(make_job(attempts=3), "boom"))
+    ((_, params),) = database.queries
+    assert params["status"] == JobStatus.FAILED
+    assert params["error"] == "boom"
+    assert queue.metrics["test"]["failed"] == 1
+
+
+def test_run_limits_concurrency_per_type(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.01)
+    queue = JobQueue()
+    pending = [make_job(id_) for id_ in range(1, 6)]
+    limits = []
+    finished = []
+    running = [0, 0]
+
+    async def handler(id_):
+        running[0] += 1
+        running[1] = max(running[1], running[0])
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+
+    async def claim(type_, limit):
+        limits.append(limit)
+        claimed, pending[:] = pending[:limit], pending[limit:]
+        return claimed
+
+    async def finish(job, error=None):
+        finished.append((job.id, error))
+        if not pending and len(finished) == 5:
+            queue.stop()
+
+    async def purge():
+        pass
+
+    monkeypatch.setattr(queue, "claim", claim)
+    monkeypatch.setattr(queue, "_finish", finish)
+    monkeypatch.setattr(queue, "purge", purge)
+    queue.register("test", handler, concurrency=2)
+    asyncio.run(asyncio.wait_for(queue.run(), 5))
+    assert sorted(finished) == [(id_, None) for id_ in range(1, 6)]
+    assert running[1] == 2
+    assert max(limits) == 2
+    assert queue.running["test"] == 0
+
+
+def test_stats(database):
+    now = datetime.utcnow()
+    database.rows = [
+        {
+            "type": "test",
+            "status": JobStatus.QUEUED,
+            "count": 3,
+            "oldest": now - timedelta(seconds=10),
+        },
+        {"type": "test", "status": JobStatus.DONE, "count": 4, "oldest": None},
+    ]
+    queue = JobQueue()
+    queue.metrics["test"]["done"] = 4
+    queue.metrics["test"]["run"] = 2.0
+    stats = asyncio.run(queue.stats())["test"]
+    assert (stats["queued"], stats["done"], stats["failed"]) == (3, 4, 0)
+    assert 10 <= stats["latency"] < 15
+    assert stats["worker"]["run"] == 0.5
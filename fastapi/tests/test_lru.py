@@ -0,0 +1,38 @@
+from utils.lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.lru.monotonic", lambda: now[0])
+    cache = LRUCache(10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_weighted_size():
+    cache = LRUCache(10, weigh=len)
+    cache.set("a", b"12345")
+    cache.set("b", b"1234")
+    cache.set("a", b"123")
+    assert cache.stats()["size"] == 7
+    cache.set("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.stats()["size"] == 8
+    # Values larger than the whole cache are never stored
+    cache.set("d", b"x" * 11)
+    assert cache.get("d") is None
+    assert cache.stats()["size"] == 8
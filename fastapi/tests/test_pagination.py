@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from database.pagination import InvalidCursor, decode_cursor, encode_cursor
+from dependencies import CommonQueryParams
+from models import User
+
+
+def test_cursor_round_trip():
+    values = [datetime(2020, 1, 2, 3, 4, 5), 42]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "e30", "W3sieCI6MX1d"])
+def test_undecodable_cursor(cursor):
+    # Not base64, {} and [{"x":1}]
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_wrongly_typed_encoded_value():
+    # [{"dt":5}]
+    cursor = "W3siZHQiOjV9XQ"
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+    with pytest.raises(HTTPException) as info:
+        CommonQueryParams(cursor=cursor)
+    assert info.value.status_code == 400
+
+
+def test_read_query_with_valid_cursor():
+    cursor = User.cursor({"joined": datetime(2020, 1, 1), "id": 7}, User.c.joined)
+    query = User.read_query(order_by=User.c.joined, cursor=cursor)
+    assert '("user".joined, "user".id) >' in str(query)
+
+
+def test_read_query_rejects_wrong_arity():
+    cursor = encode_cursor([7])
+    with pytest.raises(InvalidCursor):
+        User.read_query(order_by=User.c.joined, cursor=cursor)
+
+
+def test_read_query_rejects_wrong_types():
+    cursor = encode_cursor(["yesterday", 7])
+    with pytest.raises(InvalidCursor):
+        User.read_query(order_by=User.c.joined, cursor=cursor)
+    cursor = encode_cursor([datetime(2020, 1, 1), True])
+    with pytest.raises(InvalidCursor):
+        User.read_query(order_by=User.c.joined, cursor=cursor)
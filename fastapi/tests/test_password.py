@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app import settings
+from utils.password import (
+    PasswordQueueFull,
+    check_password,
+    check_password_async,
+    hash_password_async,
+    is_hashed_password,
+    shutdown_password_pool,
+)
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    shutdown_password_pool()
+
+
+def test_hash_and_check_in_the_pool():
+    async def main():
+        hashed = await hash_password_async("secret")
+        return (
+            hashed,
+            await check_password_async("secret", hashed),
+            await check_password_async("wrong", hashed),
+        )
+
+    hashed, valid, invalid = asyncio.run(main())
+    assert is_hashed_password(hashed)
+    assert check_password("secret", hashed)
+    assert valid and not invalid
+
+
+def test_queue_limit(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_LIMIT", 1)
+
+    async def main():
+        return await asyncio.gather(
+            hash_password_async("first"),
+            hash_password_async("second"),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(main())
+    assert is_hashed_password(first)
+    assert isinstance(second, PasswordQueueFull)
+    # The slot is free again once the first hash finished
+    assert is_hashed_password(asyncio.run(hash_password_async("third")))
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Set
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import Schema
+
+from database import DbBaseModel, generate_table, metadata, responses
+from database.responses import ModelJSONResponse, model_dict, model_response
+
+
+class Color(str, Enum):
+    RED = "red"
+
+
+class ResponseRow(DbBaseModel):
+    title: str = Schema(None, alias="headline")
+    secret: str = Schema(None, write_only=True)
+    color: Color = Color.RED
+    tags: Set[str] = set()
+    price: Decimal = None
+    created: datetime = None
+    token: UUID = None
+
+
+generate_table(ResponseRow, metadata)
+
+
+def make_row(id_=1):
+    return ResponseRow(
+        id=id_,
+        headline="Hello",
+        secret="hidden",
+        tags={"a"},
+        price=Decimal("1.5"),
+        created=datetime(2020, 1, 2, 3, 4, 5),
+        token=UUID(int=id_),
+    )
+
+
+def expected(obj):
+    return jsonable_encoder(obj.dict(by_alias=True, exclude={"secret"}))
+
+
+def test_model_dict_uses_aliases_and_skips_write_only_fields():
+    values = model_dict(make_row())
+    assert values["headline"] == "Hello"
+    assert "title" not in values and "secret" not in values
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_matches_the_fastapi_encoding(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    rows = [make_row(1), make_row(2)]
+    body = json.loads(ModelJSONResponse(rows).body)
+    assert body == [expected(row) for row in rows]
+    assert json.loads(ModelJSONResponse(rows[0]).body) == expected(rows[0])
+
+
+def test_model_response_only_wraps_trusted_results():
+    @model_response
+    async def endpoint(result):
+        return result
+
+    response = asyncio.run(endpoint(make_row()))
+    assert isinstance(response, ModelJSONResponse)
+    assert json.loads(response.body) == expected(make_row())
+    assert asyncio.run(endpoint({"plain": 1})) == {"plain": 1}
+    assert isinstance(asyncio.run(endpoint([make_row()])), ModelJSONResponse)
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app import settings
+from utils import auth_cache
+from utils.revocation import Revocations
+from utils.tokens import create_token, decode_token, revoke_token
+
+
+class MemoryStore:
+    """
+    A local stand-in for RevocationStore.
+    """
+
+    def __init__(self):
+        self.revoked = {}
+        self.lookups = 0
+
+    async def add(self, jti, expires=None):
+        self.revoked[jti] = expires
+
+    async def contains(self, jti):
+        self.lookups += 1
+        return jti in self.revoked
+
+    async def jtis(self):
+        for jti in list(self.revoked):
+            yield jti
+
+    async def purge(self):
+        now = datetime.utcnow()
+        for jti, expires in list(self.revoked.items()):
+            if expires is not None and expires < now:
+                del self.revoked[jti]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryStore()
+    revocations = Revocations(store)
+    monkeypatch.setattr(auth_cache, "REVOCATIONS", revocations)
+    monkeypatch.setattr("utils.tokens.REVOCATIONS", revocations)
+    auth_cache.CLAIMS_CACHE.clear()
+    return store
+
+
+def test_unrevoked_tokens_never_reach_the_store(store):
+    token = create_token(data={"sub": "1"}, expires_delta=timedelta(minutes=5))
+    for _ in range(3):
+        assert asyncio.run(auth_cache.verify_token(token))["sub"] == "1"
+    assert store.lookups == 0
+
+
+def test_revoked_token_is_rejected(store):
+    token = create_token(data={"sub": "1"}, expires_delta=timedelta.max)
+    asyncio.run(auth_cache.verify_token(token))
+    asyncio.run(revoke_token(token))
+    with pytest.raises(HTTPException):
+        asyncio.run(auth_cache.verify_token(token))
+    assert store.lookups == 1
+
+
+def test_bloom_hits_are_confirmed_with_the_store(store):
+    revocations = auth_cache.REVOCATIONS
+    revocations.bloom.add("not-revoked")
+    assert not asyncio.run(revocations.is_revoked("not-revoked"))
+    assert store.lookups == 1
+
+
+def test_other_processes_see_revocations_after_rebuilding(store):
+    other = Revocations(store)
+    asyncio.run(auth_cache.REVOCATIONS.revoke("jti"))
+    # Missed until the next sync of the other process
+    assert not asyncio.run(other.is_revoked("jti"))
+    asyncio.run(other.rebuild())
+    assert asyncio.run(other.is_revoked("jti"))
+
+
+def test_rebuild_purges_expired_revocations(store):
+    revocations = auth_cache.REVOCATIONS
+    asyncio.run(revocations.revoke("old", datetime.utcnow() - timedelta(seconds=1)))
+    asyncio.run(revocations.rebuild())
+    assert "old" not in store.revoked
+    assert not asyncio.run(revocations.is_revoked("old"))
+
+
+def legacy_token(**claims):
+    claims = {"sub": "1", "iss": settings.TOKEN_ISSUER, **claims}
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.TOKEN_ALGORITHM)
+
+
+def test_tokens_without_audience_are_accepted_until_they_expire():
+    expires = datetime.utcnow() + timedelta(minutes=5)
+    assert decode_token(legacy_token(exp=expires))["sub"] == "1"
+    with pytest.raises(jwt.PyJWTError):
+        decode_token(legacy_token())
+    with pytest.raises(jwt.PyJWTError):
+        decode_token(legacy_token(exp=expires, aud="other"))
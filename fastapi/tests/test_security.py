@@ -0,0 +1,62 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.testclient import TestClient
+
+from middleware.security import SecurityHeadersMiddleware
+
+app = Starlette()
+app.add_middleware(SecurityHeadersMiddleware)
+
+
+@app.route("/")
+async def index(_request):
+    return PlainTextResponse("ok")
+
+
+@app.route("/framed")
+async def framed(_request):
+    return PlainTextResponse("ok", headers={"X-Frame-Options": "deny"})
+
+
+@app.route("/stream")
+async def stream(_request):
+    async def chunks():
+        for chunk in (b"a", b"b", b"c"):
+            yield chunk
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+client = TestClient(app)
+
+
+def test_adds_the_security_headers():
+    response = client.get("/")
+    assert response.headers["x-frame-options"] == "sameorigin"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["referrer-policy"] == "strict-origin-when-cross-origin"
+
+
+def test_keeps_headers_set_by_the_response():
+    response = client.get("/framed")
+    assert response.headers["x-frame-options"] == "deny"
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+def test_streaming_responses_pass_through():
+    response = client.get("/stream")
+    assert response.text == "abc"
+    assert response.headers["x-frame-options"] == "sameorigin"
+
+
+def test_custom_headers():
+    custom = Starlette()
+    custom.add_middleware(SecurityHeadersMiddleware, headers={"X-Test": "1"})
+
+    @custom.route("/")
+    async def home(_request):
+        return PlainTextResponse("ok")
+
+    response = TestClient(custom).get("/")
+    assert response.headers["x-test"] == "1"
+    assert "x-frame-options" not in response.headers
@@ -0,0 +1,68 @@
+import asyncio
+import glob
+import json
+import os
+
+import pytest
+
+from app import settings
+from utils import source_map
+from utils.source_map import SourceMapCache
+
+MAP = json.dumps(
+    {"version": 3, "sources": ["app.ts"], "names": ["main"], "mappings": "AAAAA"}
+)
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    fetched = []
+
+    async def fetch(filename, etag=None):
+        fetched.append(filename)
+        if etag == "v1":
+            return 304, etag, None
+        return 200, "v1", MAP
+
+    monkeypatch.setattr(source_map, "_fetch", fetch)
+    monkeypatch.setattr(settings, "SOURCEMAP_CACHE_DIR", str(tmp_path))
+    cache = SourceMapCache()
+    cache.fetched = fetched
+    return cache
+
+
+def test_text_survives_eviction_while_loading(cache):
+    load = cache._load
+
+    async def load_then_evict(filename):
+        entry = await load(filename)
+        # Another map loaded meanwhile pushed this one out of memory
+        cache.entries.clear()
+        return entry
+
+    cache._load = load_then_evict
+    assert asyncio.run(cache.text("main.js.map")) == MAP
+
+
+def test_memory_hits_touch_the_disk_cache(cache):
+    async def main():
+        first = await cache.get("main.js.map")
+        (index,) = glob.glob(os.path.join(settings.SOURCEMAP_CACHE_DIR, "*.idx"))
+        os.utime(index, (0, 0))
+        assert await cache.get("main.js.map") is first
+        return index
+
+    index = asyncio.run(main())
+    assert cache.hits == 1
+    assert cache.fetched == ["main.js.map"]
+    assert os.path.getmtime(index) > 0
+
+
+def test_lookup(cache):
+    loaded = asyncio.run(cache.get("main.js.map"))
+    assert loaded.lookup(0, 0) == {
+        "source": "app.ts",
+        "line": 0,
+        "column": 0,
+        "name": "main",
+    }
@@ -0,0 +1,139 @@
+import asyncio
+import importlib
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from database import database
+from models import User
+from utils.password import hash_password
+
+statements = importlib.import_module("database.statements")
+
+
+class FakeRawConnection:
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    async def fetchrow(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.row
+
+
+class FakeDatabase:
+    def __init__(self, row, backend=None):
+        self.raw_connection = FakeRawConnection(row)
+        self.fetched = []
+        if backend is not None:
+            self._backend = backend
+
+    def connection(self):
+        raw_connection = self.raw_connection
+
+        class Connection:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+        connection = Connection()
+        connection.raw_connection = raw_connection
+        return connection
+
+    async def fetch_one(self, query):
+        self.fetched.append(query)
+        return None
+
+
+class CompilingDatabase:
+    """
+    Compiles the queries given to the public API like databases does.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def _compile(self, query):
+        compiled = query.compile(dialect=postgresql.dialect())
+        self.queries.append((compiled.string, compiled.construct_params()))
+
+    async def fetch_one(self, query):
+        self._compile(query)
+        return {"id": 7, "joined": datetime(2020, 1, 1)}
+
+    async def execute(self, query):
+        self._compile(query)
+
+
+USER_ROW = (1, "First", "Last", "a@example.com", "x" * 100, True, False, False)
+USER_ROW += (datetime(2020, 1, 1),)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = statements.StatementCache()
+    monkeypatch.setattr(statements, "STATEMENT_CACHE", cache)
+    monkeypatch.setattr(statements, "is_asyncpg", lambda: True)
+    return cache
+
+
+def test_repeated_query_hits_the_cache(monkeypatch, cache):
+    fake = FakeDatabase(USER_ROW, database._backend)
+    monkeypatch.setattr(statements, "database", fake)
+    for _ in range(3):
+        row = asyncio.run(User.get(1, parse=False))
+    assert row["email"] == "a@example.com"
+    assert row[User.c.joined] == datetime(2020, 1, 1)
+    assert cache.stats()["statements"] == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+    sql, args = fake.raw_connection.queries[0]
+    assert "$1" in sql and args == (1,)
+
+
+def test_falls_back_without_the_private_api(monkeypatch, cache):
+    fake = FakeDatabase(USER_ROW)
+    monkeypatch.setattr(statements, "database", fake)
+    asyncio.run(User.get(1, parse=False))
+    asyncio.run(User.get(1, parse=False))
+    assert not cache.supported
+    assert len(fake.fetched) == 2
+    assert not fake.raw_connection.queries
+
+
+@pytest.mark.parametrize("asyncpg", [False, True])
+def test_save_and_delete_without_the_cache(monkeypatch, cache, asyncpg):
+    fake = CompilingDatabase()
+    monkeypatch.setattr(statements, "database", fake)
+    monkeypatch.setattr(statements, "is_asyncpg", lambda: asyncpg)
+    # With asyncpg the cache disabled itself since the private API is missing
+    cache.supported = False
+    user = User.construct(
+        {
+            "id": None,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": "a@example.com",
+            "password": hash_password("secret"),
+        },
+        {"first_name", "last_name", "email", "password"},
+    )
+
+    async def main():
+        await user.save()
+        user.first_name = "New"
+        await user.save()
+        await user.delete()
+
+    asyncio.run(main())
+    (insert, insert_params), (update, update_params), (delete, delete_params) = (
+        fake.queries
+    )
+    assert insert.startswith("INSERT") and insert_params["v_email"] == "a@example.com"
+    assert update.startswith("UPDATE") and update_params["v_first_name"] == "New"
+    assert update_params["v_id"] == 7
+    assert delete.startswith("DELETE") and delete_params == {"v_id": 7}
+    assert user.id is None
+    assert not cache.statements
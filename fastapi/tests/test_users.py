@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+import routes  # pylint: disable=unused-import
+from app.asgi import app
+from database import statements
+from database.cache import MODEL_CACHE
+from routes import users
+from models import User
+from utils.auth_cache import AUTH_USER_CACHE, CLAIMS_CACHE
+from utils.password import hash_password
+from utils.tokens import create_token
+
+HASHED = hash_password("secret")
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    writes = []
+
+    async def fetch_one(key, build, values):
+        writes.append((key, values))
+        return {"id": 2}
+
+    monkeypatch.setattr(statements, "fetch_one", fetch_one)
+    monkeypatch.setattr(MODEL_CACHE, "redis", None)
+    MODEL_CACHE.local.clear()
+    AUTH_USER_CACHE.clear()
+    CLAIMS_CACHE.clear()
+    user = User.construct(
+        {
+            "id": 1,
+            "first_name": "First",
+            "last_name": "Last",
+            "email": "user1@example.com",
+            "password": HASHED,
+            "is_confirmed": False,
+            "is_staff": False,
+            "is_admin": False,
+            "joined": None,
+        },
+        {"id", "first_name", "last_name", "email", "password"},
+    )
+    asyncio.run(MODEL_CACHE.set(user))
+    yield writes
+    MODEL_CACHE.local.clear()
+
+
+def test_update_a_cached_user(writes):
+    token = create_token(data={"sub": "1"})
+    response = TestClient(app).put(
+        "/me", json={"first_name": "New"}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert "password" not in response.json()
+    ((key, values),) = writes
+    assert key[1] == "update"
+    assert values["v_first_name"] == "New"
+    # The password hash is written back unchanged
+    assert values["v_password"] == HASHED
+
+
+def test_confirm_email_of_a_cached_user(writes):
+    token = create_token(data={"sub": "1"})
+    response = TestClient(app).get(f"/confirm-email/{token}")
+    assert response.status_code == 200
+    ((_, values),) = writes
+    assert values["v_is_confirmed"] is True
+
+
+def test_register_succeeds_when_the_welcome_email_fails(monkeypatch, writes):
+    def send_email(*args, **kwargs):
+        raise AttributeError("email misconfigured")
+
+    monkeypatch.setattr(users, "send_email", send_email)
+    response = TestClient(app).post(
+        "/register",
+        json={
+            "first_name": "First",
+            "last_name": "Last",
+            "email": "new@example.com",
+            "password": "secret",
+        },
+    )
+    assert response.status_code == 201, response.text
+    ((key, _),) = writes
+    assert key[1] == "insert"
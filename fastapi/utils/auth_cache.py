@@ -0,0 +1,86 @@
+"""
+In-process caches for the authentication fast path.
+
+* Verified JWT claims are kept in a bounded LRU keyed by the token, so each
+token is only decoded and verified once until it expires. Revocation is still
+checked on every use through the in-memory Bloom filter of REVOCATIONS.
+
+* A short lived snapshot of a user's authorization fields lets current_staff
+and current_admin reject users without loading them, the users they let
+through are then loaded through the MODEL_CACHE. Snapshots are dropped when
+the user is saved, deleted or written by the User bulk methods in this
+process. The caches are per process, so other processes keep using their
+snapshot for up to AUTH_USER_TTL seconds after a change.
+"""
+
+from collections import namedtuple
+from time import time
+
+from jwt import PyJWTError
+
+from app import settings
+from utils.lru import LRUCache
+from utils.revocation import REVOCATIONS
+from utils.tokens import CREDENTIALS_EXCEPTION, decode_token
+
+__all__ = [
+    "AuthUser",
+    "verify_token",
+    "forget_token",
+    "remember_user",
+    "get_auth_user",
+    "forget_user",
+]
+
+
+AuthUser = namedtuple("AuthUser", ("id", "is_confirmed", "is_staff", "is_admin"))
+
+CLAIMS_CACHE = LRUCache(settings.TOKEN_CLAIMS_CACHE_SIZE, settings.TOKEN_CLAIMS_TTL)
+AUTH_USER_CACHE = LRUCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_TTL)
+
+
+async def verify_token(token):
+    """
+    Return the verified claims of a token, raises CREDENTIALS_EXCEPTION if invalid or revoked.
+    """
+    claims = CLAIMS_CACHE.get(token)
+    if claims is None:
+        claims = _decode_token(token)
+    if await REVOCATIONS.is_revoked(claims.get("jti")):
+        forget_token(token)
+        raise CREDENTIALS_EXCEPTION
+    return claims
+
+
+def _decode_token(token):
+    try:
+        claims = decode_token(token)
+    except PyJWTError:
+        raise CREDENTIALS_EXCEPTION
+    if not claims.get("sub"):
+        raise CREDENTIALS_EXCEPTION
+    ttl = settings.TOKEN_CLAIMS_TTL
+    if "exp" in claims:
+        # Never keep the claims past the expiration of the token
+        ttl = min(ttl, claims["exp"] - time())
+    if ttl > 0:
+        CLAIMS_CACHE.set(token, claims, ttl)
+    return claims
+
+
+def forget_token(token):
+    CLAIMS_CACHE.delete(token)
+
+
+def remember_user(user):
+    auth_user = AuthUser(user.id, user.is_confirmed, user.is_staff, user.is_admin)
+    AUTH_USER_CACHE.set(str(user.id), auth_user)
+    return auth_user
+
+
+def get_auth_user(user_id):
+    return AUTH_USER_CACHE.get(str(user_id))
+
+
+def forget_user(user_id):
+    AUTH_USER_CACHE.delete(str(user_id))
@@ -1,15 +1,30 @@
+import asyncio
 import json
 import os
+from collections import defaultdict, deque
 from base64 import b64encode
+from time import monotonic
 
+from aiohttp import ClientResponseError
+
+from app import settings
 from utils.http import decode_response
 
 
+async def _b2_request(session, url, headers, data=None):
+    if data:
+        async with session.post(url, headers=headers, data=data) as response:
+            return await decode_response(response)
+    else:
+        async with session.get(url, headers=headers) as response:
+            return await decode_response(response)
+
+
 async def b2(session, endpoint, headers, auth=None, data=None):
     if endpoint.startswith("https://"):
         url = endpoint
     else:
-        origin = auth["apiUrl"] if auth else "https://api.backblazeb2.com"
+        origin = auth["apiUrl"] if auth else settings.B2_API_URL
         url = f"{origin}/b2api/v2/{endpoint}"
     headers["Accept"] = "application/json"
     if auth:
@@ -20,21 +35,83 @@ async def b2(session, endpoint, headers, auth=None, data=None):
         elif not isinstance(data, (str, bytes)):
             data = json.dumps(data).encode("utf-8")
             headers["Content-Type"] = "application/json"
-        async with session.post(url, headers=headers, data=data) as response:
-            return await decode_response(response)
-    else:
-        async with session.get(url, headers=headers) as response:
-            return await decode_response(response)
+    try:
+        return await _b2_request(session, url, headers, data)
+    except ClientResponseError as e:
+        # Retry once with a fresh account authorization if it expired or was revoked
+        if (
+            e.status != 401
+            or not auth
+            or headers["Authorization"] != auth["authorizationToken"]
+        ):
+            raise
+        auth = await b2_authorize_account(session, force=True)
+        headers["Authorization"] = auth["authorizationToken"]
+        return await _b2_request(session, url, headers, data)
 
 
-async def b2_authorize_account(session):
-    app_key_id = os.getenv("B2_APPLICATION_KEY_ID")
-    app_key = os.getenv("B2_APPLICATION_KEY")
-    assert app_key_id and app_key
-    encoded = b64encode(f"{app_key_id}:{app_key}".encode("utf-8")).decode("utf-8")
-    return await b2(
-        session, "b2_authorize_account", headers={"Authorization": f"Basic {encoded}"}
-    )
+class B2Authorization:
+    """
+    Caches the b2_authorize_account response for the lifetime of its token.
+    The token is refreshed in the background B2_AUTH_REFRESH_MARGIN seconds before it expires,
+    concurrent callers share a single in-flight refresh.
+    """
+
+    def __init__(self):
+        self.auth = None
+        self.expires = 0
+        self.refresh_at = 0
+        self._task = None
+
+    async def _authorize(self, session):
+        app_key_id = os.getenv("B2_APPLICATION_KEY_ID")
+        app_key = os.getenv("B2_APPLICATION_KEY")
+        assert app_key_id and app_key
+        encoded = b64encode(f"{app_key_id}:{app_key}".encode("utf-8")).decode("utf-8")
+        start = monotonic()
+        auth = await b2(
+            session,
+            "b2_authorize_account",
+            headers={"Authorization": f"Basic {encoded}"},
+        )
+        self.auth = auth
+        self.expires = start + settings.B2_AUTH_LIFETIME
+        self.refresh_at = self.expires - settings.B2_AUTH_REFRESH_MARGIN
+        return auth
+
+    def _refresh(self, session):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._authorize(session))
+            # Background refreshes are never awaited, so retrieve any exception here
+            self._task.add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+        return self._task
+
+    async def get(self, session, force=False):
+        now = monotonic()
+        if not force and self.auth is not None and now < self.expires:
+            if now >= self.refresh_at:
+                self._refresh(session)
+            return self.auth
+        if force and self._task is not None and self._task.done():
+            self._task = None
+        return await asyncio.shield(self._refresh(session))
+
+    def clear(self):
+        self.auth = None
+        self.expires = 0
+        self.refresh_at = 0
+
+
+B2_AUTH = B2Authorization()
+
+
+async def b2_authorize_account(session, force=False):
+    """
+    Returns the cached account authorization, set force=True to authorize again.
+    """
+    return await B2_AUTH.get(session, force)
 
 
 BUCKET_ID_CACHE = {}
@@ -49,3 +126,85 @@ async def b2_get_bucket_id(session, auth, bucket):
     updates = {entry["bucketName"]: entry["bucketId"] for entry in buckets["buckets"]}
     BUCKET_ID_CACHE.update(updates)
     return updates.get(bucket)
+
+
+async def b2_get_upload_url(session, bucket):
+    """
+    Returns a dict with bucketId, uploadUrl, and authorizationToken keys
+    """
+    auth = await b2_authorize_account(session)
+    bucket_id = await b2_get_bucket_id(session, auth, bucket)
+    return await b2(session, "b2_get_upload_url", {}, auth, {"bucketId": bucket_id})
+
+
+class UploadUrlPool:
+    """
+    Pre-fetched upload URLs per bucket.
+    B2 requires a separate upload URL for every concurrent upload, so URLs are checked out
+    exclusively and released after a successful upload or discarded after a failed one.
+    The pool is refilled in the background up to B2_UPLOAD_URL_POOL_SIZE idle URLs per bucket.
+    """
+
+    def __init__(self):
+        # bucket -> deque of upload URL dicts
+        self.idle = defaultdict(deque)
+        self._refills = {}
+
+    @staticmethod
+    async def _fetch(session, bucket):
+        # Upload URLs are valid for 24 hours, like the account authorization
+        expires = (
+            monotonic() + settings.B2_AUTH_LIFETIME - settings.B2_AUTH_REFRESH_MARGIN
+        )
+        upload_url = await b2_get_upload_url(session, bucket)
+        upload_url["expires"] = expires
+        return upload_url
+
+    async def _fill(self, session, bucket):
+        missing = settings.B2_UPLOAD_URL_POOL_SIZE - len(self.idle[bucket])
+        if missing > 0:
+            upload_urls = await asyncio.gather(
+                *[self._fetch(session, bucket) for _ in range(missing)]
+            )
+            self.idle[bucket].extend(upload_urls)
+
+    def _refill(self, session, bucket):
+        task = self._refills.get(bucket)
+        if task is None or task.done():
+            task = self._refills[bucket] = asyncio.ensure_future(
+                self._fill(session, bucket)
+            )
+            # Failed refills are retried on the next checkout
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def checkout(self, session, bucket):
+        idle = self.idle[bucket]
+        now = monotonic()
+        upload_url = None
+        while idle and upload_url is None:
+            upload_url = idle.popleft()
+            if upload_url["expires"] <= now:
+                upload_url = None
+        self._refill(session, bucket)
+        if upload_url is None:
+            upload_url = await self._fetch(session, bucket)
+        return upload_url
+
+    def release(self, bucket, upload_url):
+        idle = self.idle[bucket]
+        if (
+            upload_url["expires"] > monotonic()
+            and len(idle) < settings.B2_UPLOAD_URL_POOL_SIZE
+        ):
+            idle.append(upload_url)
+
+    def discard(self, session, bucket, upload_url):
+        # Never reuse a URL after a failed upload, fetch a replacement in the background
+        upload_url["expires"] = 0
+        self._refill(session, bucket)
+
+    def clear(self):
+        self.idle.clear()
+
+
+UPLOAD_URLS = UploadUrlPool()
@@ -0,0 +1,34 @@
+"""
+A simple Bloom filter for fast in-memory "definitely not present" checks.
+"""
+
+from hashlib import blake2b
+from math import ceil, log
+
+__all__ = ["BloomFilter"]
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        # Optimal bit count and number of hashes for the capacity and false positive rate
+        self.size = max(8, ceil(-capacity * log(error_rate) / (log(2) ** 2)))
+        self.num_hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(ceil(self.size / 8))
+        self.count = 0
+
+    def _indexes(self, item):
+        # Double hashing, derive all of the indexes from two 64-bit hashes
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.num_hashes))
+
+    def add(self, item):
+        for index in self._indexes(item):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(item)
+        )
@@ -2,22 +2,26 @@ import json
 import os
 from mimetypes import guess_type
 
+from app import settings
 from utils.http import decode_response
 
 
-async def bunny(session, endpoint, data=None, storage=False):
+async def bunny(session, endpoint, data=None, storage=False, delete=False):
     access_key = os.getenv("BUNNYCDN_ACCESS_KEY")
     storage_access_key = os.getenv("BUNNYCDN_STORAGE_ACCESS_KEY")
     assert access_key
     assert not storage or storage_access_key
     if storage:
-        url = f"https://storage.bunnycdn.com/{endpoint}"
+        url = f"{settings.BUNNYCDN_STORAGE_URL}/{endpoint}"
     else:
-        url = f"https://bunnycdn.com/api/{endpoint}"
+        url = f"{settings.BUNNYCDN_API_URL}/{endpoint}"
     headers = {
         "Accept": "application/json",
         "AccessKey": storage_access_key if storage else access_key,
     }
+    if delete:
+        async with session.delete(url, headers=headers) as response:
+            return await decode_response(response)
     if data:
         if isinstance(data, str):
             data = data.encode("utf-8")
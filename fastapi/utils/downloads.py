@@ -1,8 +1,7 @@
 import os
 
-import aiohttp
-
 from utils.b2 import b2, b2_authorize_account, b2_get_bucket_id
+from utils.http import http_session
 
 
 def create_s3_download_url(bucket, key):
@@ -21,13 +20,13 @@ def create_s3_download_url(bucket, key):
 
 async def create_b2_download_url(bucket, file_name):
     """Returns a download URL"""
-    async with aiohttp.ClientSession() as session:
-        auth = await b2_authorize_account(session)
-        bucket_id = await b2_get_bucket_id(session, auth, bucket)
-        data = {
-            "bucketId": bucket_id,
-            "fileNamePrefix": file_name,
-            "validDurationInSeconds": 3600,
-        }
-        response = await b2(session, "b2_get_upload_url", {}, auth, data)
-        return f"{auth['downloadUrl']}/file/{bucket}/{file_name}?Authorization={response['authorizationToken']}"
+    session = http_session()
+    auth = await b2_authorize_account(session)
+    bucket_id = await b2_get_bucket_id(session, auth, bucket)
+    data = {
+        "bucketId": bucket_id,
+        "fileNamePrefix": file_name,
+        "validDurationInSeconds": 3600,
+    }
+    response = await b2(session, "b2_get_upload_url", {}, auth, data)
+    return f"{auth['downloadUrl']}/file/{bucket}/{file_name}?Authorization={response['authorizationToken']}"
@@ -1,8 +1,240 @@
-import emails
-from emails.template import JinjaTemplate
+"""
+Asynchronous email delivery.
+
+send_email() renders the message and adds it to an outbox, so a request never
+waits on SMTP. The outbox is drained by background tasks that each own a pooled
+SMTP connection. Each batch of up to EMAIL_BATCH_SIZE waiting messages is sent
+over one session. Connections stay open between batches, are reconnected when
+the server drops them and are closed once no message arrived for
+SMTP_IDLE_TIMEOUT seconds.
+smtplib runs in a dedicated thread per connection so the event loop is never
+blocked.
+
+Templates are looked up by name in EMAIL_TEMPLATE_DIR (the build output of
+emails/, e.g. "welcome" -> welcome.html), otherwise the string itself is used
+as the template source. Compiled templates are cached by name.
+
+Any SMTP server works for testing, such as a local aiosmtpd sink with SMTP_TLS
+disabled. MAILER.stats() reports the throughput in messages/sec.
+"""
+
+import asyncio
+import os
+import smtplib
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from email.utils import formataddr
+from time import monotonic
+
+from jinja2 import Environment
 
 from app import settings
 
+__all__ = ["MAILER", "Mailer", "SmtpConnection", "get_template", "send_email"]
+
+
+_HTML_ENV = Environment(autoescape=True)
+_TEXT_ENV = Environment(autoescape=False)
+
+# (name, html) -> compiled template
+TEMPLATE_CACHE = {}
+
+
+def get_template(name, html=True):
+    key = (name, html)
+    template = TEMPLATE_CACHE.get(key)
+    if template is None:
+        source = name
+        path = os.path.join(settings.EMAIL_TEMPLATE_DIR, f"{name}.html")
+        if html and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+        env = _HTML_ENV if html else _TEXT_ENV
+        template = TEMPLATE_CACHE[key] = env.from_string(source)
+    return template
+
+
+class SmtpConnection:
+    """
+    A persistent SMTP connection, all of its calls run in its own thread.
+    """
+
+    def __init__(self):
+        self.smtp = None
+        self.last_used = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT
+        )
+        if settings.SMTP_TLS:
+            smtp.starttls()
+        if settings.SMTP_USER and settings.SMTP_PASSWORD:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        self.smtp = smtp
+
+    def _close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+    def _send_batch(self, messages):
+        if monotonic() - self.last_used > settings.SMTP_IDLE_TIMEOUT:
+            self._close()
+        errors = []
+        for message in messages:
+            error = None
+            # A dropped connection is reopened and the message sent again once
+            for retry in (True, False):
+                try:
+                    if self.smtp is None:
+                        self._connect()
+                    self.smtp.send_message(message)
+                    error = None
+                    break
+                except (
+                    smtplib.SMTPServerDisconnected,
+                    ConnectionError,
+                    socket.timeout,
+                ) as e:
+                    self._close()
+                    error = e
+                    if not retry:
+                        break
+                except (smtplib.SMTPException, OSError) as e:
+                    # Rejected by the server, the connection can still be used
+                    error = e
+                    break
+            errors.append(error)
+        self.last_used = monotonic()
+        return errors
+
+    async def send_batch(self, messages):
+        """
+        Send the messages in one session, returns a list of None or the error for each.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._send_batch, messages)
+
+    async def disconnect(self):
+        """
+        Close the SMTP session, the next batch opens a new one.
+        """
+        if self.smtp is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self.executor, self._close)
+
+    async def close(self):
+        await self.disconnect()
+        self.executor.shutdown(wait=False)
+
+
+class Mailer:
+    def __init__(self):
+        self.outbox = None
+        self.connections = []
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        # Time spent with at least one batch being sent, for the throughput
+        self.active = 0.0
+        self._sending = 0
+        self._active_since = 0.0
+
+    def start(self):
+        if self.outbox is not None:
+            return
+        self.outbox = asyncio.Queue()
+        self.connections = [SmtpConnection() for _ in range(settings.SMTP_POOL_SIZE)]
+        self._tasks = [
+            asyncio.ensure_future(self._drain(connection))
+            for connection in self.connections
+        ]
+
+    async def _send(self, connection, batch):
+        if not self._sending:
+            self._active_since = monotonic()
+        self._sending += 1
+        try:
+            return await connection.send_batch([message for message, _ in batch])
+        except Exception as e:  # pylint: disable=broad-except
+            return [e] * len(batch)
+        finally:
+            self._sending -= 1
+            if not self._sending:
+                self.active += monotonic() - self._active_since
+
+    async def _drain(self, connection):
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    self.outbox.get(), settings.SMTP_IDLE_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                await connection.disconnect()
+                continue
+            batch = [item]
+            while len(batch) < settings.EMAIL_BATCH_SIZE and not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            errors = await self._send(connection, batch)
+            self.batches += 1
+            for (message, future), error in zip(batch, errors):
+                if error is None:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                    print(f"Warning: failed to send {message['Subject']}: {error}")
+                if not future.done():
+                    future.set_result(error)
+                self.outbox.task_done()
+
+    def send(self, message):
+        """
+        Add a message to the outbox.
+        Returns a future resolving to None once sent or to the error if it failed.
+        """
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        self.outbox.put_nowait((message, future))
+        return future
+
+    async def flush(self):
+        if self.outbox is not None:
+            await self.outbox.join()
+
+    async def stop(self):
+        if self.outbox is None:
+            return
+        await self.flush()
+        for task in self._tasks:
+            task.cancel()
+        for connection in self.connections:
+            await connection.close()
+        self.outbox = None
+        self.connections = []
+        self._tasks = []
+
+    def stats(self):
+        active = self.active
+        if self._sending:
+            active += monotonic() - self._active_since
+        return {
+            "queued": self.outbox.qsize() if self.outbox is not None else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "batches": self.batches,
+            "rate": self.sent / active if active else 0.0,
+        }
+
+
+MAILER = Mailer()
+
 
 def send_email(
     email_to: str,
@@ -10,21 +242,20 @@ def send_email(
     html_template: str = "",
     context: dict = None,
 ):
-    if not settings.SMTP_HOST or not settings.SMTP_USER or not settings.SMTP_PASSWORD:
+    """
+    Render the message and add it to the outbox, see Mailer.send().
+    """
+    if not settings.SMTP_HOST or not settings.EMAIL_FROM_EMAIL:
         print(
             f"Warning: email not configured, not sending message {subject_template} to {email_to}"
         )
-        return
-    message = emails.Message(
-        subject=JinjaTemplate(settings.EMAIL_SUBJECT_PREFIX + subject_template),
-        html=JinjaTemplate(html_template),
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
-    )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    message.send(to=email_to, render=context, smtp=smtp_options)
+        return None
+    context = context or {}
+    message = EmailMessage()
+    message["Subject"] = get_template(
+        settings.EMAIL_SUBJECT_PREFIX + subject_template, html=False
+    ).render(context)
+    message["From"] = formataddr((settings.EMAIL_FROM_NAME, settings.EMAIL_FROM_EMAIL))
+    message["To"] = email_to
+    message.set_content(get_template(html_template).render(context), subtype="html")
+    return MAILER.send(message)
@@ -1,4 +1,82 @@
-from aiohttp import ClientResponseError
+"""
+App lifetime aiohttp ClientSession shared by all storage and CDN calls.
+
+A single pooled session keeps connections alive between requests to B2, S3
+and BunnyCDN so each call doesn't pay for a new TCP and TLS handshake. The
+session is started and closed with the app, but is also created on first use
+for scripts and workers.
+"""
+
+from aiohttp import ClientResponseError, ClientSession, ClientTimeout, TCPConnector
+from aiohttp import TraceConfig
+
+from app import settings
+
+__all__ = ["HTTP_CLIENT", "HttpClient", "http_session", "decode_response"]
+
+
+class HttpClient:
+    def __init__(self):
+        self.session = None
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    def _trace_config(self):
+        async def on_connection_create_end(_session, _context, _params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(_session, _context, _params):
+            self.connections_reused += 1
+
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def start(self):
+        if self.session is not None and not self.session.closed:
+            return self.session
+        connector = TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+        )
+        timeout = ClientTimeout(
+            total=settings.HTTP_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            sock_read=settings.HTTP_READ_TIMEOUT,
+        )
+        self.session = ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._trace_config()],
+        )
+        return self.session
+
+    async def stop(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self):
+        total = self.connections_created + self.connections_reused
+        return {
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_rate": self.connections_reused / total if total else 0.0,
+        }
+
+
+HTTP_CLIENT = HttpClient()
+
+
+def http_session():
+    """
+    The shared ClientSession, must be called from within a coroutine.
+    """
+    return HTTP_CLIENT.start()
 
 
 async def decode_response(response):
@@ -0,0 +1,281 @@
+"""
+Durable background jobs stored in the Job table.
+
+Jobs are added with JOBS.enqueue() and run by the worker process (worker.py)
+rather than inside a request, so they survive restarts of the app. Workers
+claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of them
+can share the table without running a job twice.
+
+* Jobs with a higher priority are claimed first, then by run_at
+
+* A failed job is retried up to max_attempts times, waiting
+JOB_RETRY_DELAY * 2^(attempt - 1) seconds between attempts
+
+* Each job type runs at most JOB_CONCURRENCY[type] jobs at once per worker,
+defaulting to JOB_DEFAULT_CONCURRENCY
+
+* Jobs still running after JOB_TIMEOUT seconds are cancelled, jobs left running
+by a worker that died are claimed again after the same timeout, or marked failed
+once they used all of their attempts. A worker only updates a job while no other
+worker claimed it again.
+
+Arguments must be JSON serializable, e.g. pass ids as strings.
+JOBS.stats() reports the queue depth and latency per job type.
+"""
+
+import asyncio
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+from time import monotonic
+
+from sqlalchemy import and_, or_, select, func
+
+from app import settings
+from database import database
+
+__all__ = ["JOBS", "JobQueue"]
+
+
+# Seconds between deleting old finished jobs
+JOB_PURGE_INTERVAL = 60 * 60
+
+
+class JobQueue:
+    # pylint: disable=import-outside-toplevel
+
+    def __init__(self):
+        # type -> (coroutine function, concurrency)
+        self.handlers = {}
+        # type -> number of jobs running in this worker
+        self.running = defaultdict(int)
+        # type -> counters of the jobs run by this worker
+        self.metrics = defaultdict(
+            lambda: {"done": 0, "retried": 0, "failed": 0, "wait": 0.0, "run": 0.0}
+        )
+        self._wakeup = None
+        self._stopping = False
+
+    def register(self, type_, handler, concurrency=None):
+        if concurrency is None:
+            concurrency = settings.JOB_CONCURRENCY.get(
+                type_, settings.JOB_DEFAULT_CONCURRENCY
+            )
+        self.handlers[type_] = (handler, concurrency)
+
+    async def enqueue(
+        self, type_, *args, priority=0, delay=0, max_attempts=None, **kwargs
+    ):
+        from models import Job
+
+        job = Job(
+            type=type_,
+            payload={"args": list(args), "kwargs": kwargs},
+            priority=priority,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        return await job.save()
+
+    async def claim(self, type_, limit):
+        """
+        Mark up to limit due jobs of a type as running and return them.
+        """
+        from models import Job
+        from models.job import JobStatus
+
+        table = Job.table
+        now = datetime.utcnow()
+        stale = and_(
+            table.c.status == JobStatus.RUNNING,
+            table.c.started < now - timedelta(seconds=settings.JOB_TIMEOUT),
+        )
+        # Jobs that killed or hung their worker on every attempt are given up on
+        await database.execute(
+            table.update()
+            .where(
+                and_(
+                    table.c.type == type_,
+                    stale,
+                    table.c.attempts >= table.c.max_attempts,
+                )
+            )
+            .values(status=JobStatus.FAILED, finished=now, error="Timed out")
+        )
+        due = or_(
+            and_(table.c.status == JobStatus.QUEUED, table.c.run_at <= now),
+            and_(stale, table.c.attempts < table.c.max_attempts),
+        )
+        ids = (
+            select([table.c.id])
+            .where(and_(table.c.type == type_, due))
+            .order_by(table.c.priority.desc(), table.c.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            table.update()
+            .where(table.c.id.in_(ids))
+            .values(
+                status=JobStatus.RUNNING, started=now, attempts=table.c.attempts + 1
+            )
+            .returning(*table.c)
+        )
+        return Job.parse_rows(await database.fetch_all(query))
+
+    async def _update(self, job, **values):
+        from models import Job
+
+        table = Job.table
+        # Once the job timed out and was claimed again its attempts changed
+        await database.execute(
+            table.update()
+            .where(and_(table.c.id == job.id, table.c.attempts == job.attempts))
+            .values(**values)
+        )
+
+    async def _finish(self, job, error=None):
+        from models.job import JobStatus
+
+        metrics = self.metrics[job.type]
+        now = datetime.utcnow()
+        if error is None:
+            metrics["done"] += 1
+            await self._update(job, status=JobStatus.DONE, finished=now, error=None)
+        elif job.attempts >= job.max_attempts:
+            metrics["failed"] += 1
+            await self._update(job, status=JobStatus.FAILED, finished=now, error=error)
+        else:
+            metrics["retried"] += 1
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            await self._update(
+                job,
+                status=JobStatus.QUEUED,
+                run_at=now + timedelta(seconds=delay),
+                error=error,
+            )
+
+    async def _run(self, job):
+        handler, _ = self.handlers[job.type]
+        metrics = self.metrics[job.type]
+        metrics["wait"] += max(0.0, (job.started - job.run_at).total_seconds())
+        start = monotonic()
+        try:
+            try:
+                await asyncio.wait_for(
+                    handler(
+                        *job.payload.get("args", ()), **job.payload.get("kwargs", {})
+                    ),
+                    settings.JOB_TIMEOUT,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                traceback.print_exc()
+                await self._finish(job, repr(e))
+            else:
+                await self._finish(job)
+        except Exception:  # pylint: disable=broad-except
+            # The job is claimed again once it times out
+            traceback.print_exc()
+        finally:
+            metrics["run"] += monotonic() - start
+            self.running[job.type] -= 1
+            self._wakeup.set()
+
+    async def purge(self):
+        """
+        Delete finished jobs older than JOB_RETENTION seconds.
+        """
+        from models import Job
+        from models.job import JobStatus
+
+        table = Job.table
+        before = datetime.utcnow() - timedelta(seconds=settings.JOB_RETENTION)
+        await database.execute(
+            table.delete().where(
+                and_(
+                    table.c.status.in_([JobStatus.DONE, JobStatus.FAILED]),
+                    table.c.finished < before,
+                )
+            )
+        )
+
+    async def run(self, types=None):
+        """
+        Claim and run jobs of the registered types until stop() is called.
+        """
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        tasks = set()
+        purged = None
+        for type_ in types or self.handlers:
+            if type_ not in self.handlers:
+                raise ValueError(f"No handler registered for {type_} jobs")
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                if purged is None or monotonic() - purged > JOB_PURGE_INTERVAL:
+                    purged = monotonic()
+                    await self.purge()
+                for type_ in types or list(self.handlers):
+                    _, concurrency = self.handlers[type_]
+                    free = concurrency - self.running[type_]
+                    if free <= 0:
+                        continue
+                    for job in await self.claim(type_, free):
+                        self.running[type_] += 1
+                        task = asyncio.ensure_future(self._run(job))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        # Let the running jobs finish
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def stop(self):
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stats(self):
+        """
+        Return the number of jobs per status and the age in seconds of the oldest due job
+        for each job type, along with the counters of the jobs run by this process.
+        """
+        from models import Job
+
+        table = Job.table
+        now = datetime.utcnow()
+        query = select(
+            [
+                table.c.type.label("type"),
+                table.c.status.label("status"),
+                func.count().label("count"),
+                func.min(table.c.run_at).filter(table.c.run_at <= now).label("oldest"),
+            ]
+        ).group_by(table.c.type, table.c.status)
+        stats = {}
+        for row in await database.fetch_all(query):
+            entry = stats.setdefault(
+                row["type"],
+                {"queued": 0, "running": 0, "done": 0, "failed": 0, "latency": 0.0},
+            )
+            status = str(row["status"])
+            entry[status] = row["count"]
+            if status == "queued" and row["oldest"] is not None:
+                entry["latency"] = max(0.0, (now - row["oldest"]).total_seconds())
+        for type_, metrics in self.metrics.items():
+            started = metrics["done"] + metrics["retried"] + metrics["failed"]
+            stats.setdefault(type_, {})["worker"] = {
+                **metrics,
+                "wait": metrics["wait"] / started if started else 0.0,
+                "run": metrics["run"] / started if started else 0.0,
+            }
+        return stats
+
+
+JOBS = JobQueue()
@@ -0,0 +1,72 @@
+"""
+A least recently used cache shared by the in-process caches.
+"""
+
+from collections import OrderedDict
+from time import monotonic
+
+__all__ = ["LRUCache"]
+
+
+class LRUCache:
+    """
+    A least recently used cache of up to size entries, or up to size in total of
+    weigh(value) when weigh is given (e.g. len for bytes).
+    With a ttl every entry also expires after ttl seconds.
+    """
+
+    def __init__(self, size, ttl=None, weigh=None):
+        self.size = size
+        self.ttl = ttl
+        self.weigh = weigh
+        # key -> (expires or None, value, weight)
+        self.entries = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] < monotonic():
+            self.delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        self.delete(key)
+        weight = self.weigh(value) if self.weigh is not None else 1
+        if weight > self.size:
+            return
+        ttl = ttl or self.ttl
+        self.entries[key] = (monotonic() + ttl if ttl else None, value, weight)
+        self.total += weight
+        while self.total > self.size:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.total -= evicted
+
+    def delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.total = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size": self.total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
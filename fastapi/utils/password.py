@@ -1,12 +1,28 @@
 """
 Password hashing functions that uses scrypt built-in to Python.
+
+scrypt is deliberately slow, so the async versions run it in a bounded process
+pool to keep the event loop free. When more than PASSWORD_HASH_QUEUE_LIMIT
+hashes are already waiting PasswordQueueFull is raised instead of queueing more.
 """
 
+import asyncio
 from base64 import b64encode, b64decode
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import scrypt
 from os import urandom
 
-__all__ = ["is_hashed_password", "hash_password", "check_password"]
+from app import settings
+
+__all__ = [
+    "is_hashed_password",
+    "hash_password",
+    "check_password",
+    "hash_password_async",
+    "check_password_async",
+    "shutdown_password_pool",
+    "PasswordQueueFull",
+]
 
 
 PASSWORD_HASH_LEN = 187
@@ -43,3 +59,47 @@ def hash_password(password, salt=None):
 def check_password(password, hashed):
     salt = hashed.split("$")[2]
     return hash_password(password, salt) == hashed
+
+
+class PasswordQueueFull(Exception):
+    """
+    Raised when too many password hashes are waiting for the process pool.
+    """
+
+
+_EXECUTOR = None
+_PENDING = 0
+
+
+def _executor():
+    global _EXECUTOR  # pylint: disable=global-statement
+    if _EXECUTOR is None:
+        _EXECUTOR = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    return _EXECUTOR
+
+
+async def _run_in_pool(func, *args):
+    global _PENDING  # pylint: disable=global-statement
+    if _PENDING >= settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise PasswordQueueFull
+    _PENDING += 1
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(_executor(), func, *args)
+    finally:
+        _PENDING -= 1
+
+
+async def hash_password_async(password, salt=None):
+    return await _run_in_pool(hash_password, password, salt)
+
+
+async def check_password_async(password, hashed):
+    return await _run_in_pool(check_password, password, hashed)
+
+
+def shutdown_password_pool():
+    global _EXECUTOR  # pylint: disable=global-statement
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False)
+        _EXECUTOR = None
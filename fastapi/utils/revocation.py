@@ -0,0 +1,119 @@
+"""
+Token revocation with a persistent denylist of jti claims fronted by a Bloom filter.
+
+Every check first goes through an in-process Bloom filter, so the common case
+of a token that was never revoked costs no I/O. A token is only rejected after
+a Bloom filter hit is confirmed with the store, so false positives are still
+accepted. The filter is rebuilt from the store every REVOCATION_SYNC_INTERVAL
+seconds to pick up revocations from other processes, which also purges
+expired entries.
+
+A revocation takes effect immediately in the process that made it, but other
+processes miss it in their Bloom filter and keep accepting the token until
+their next rebuild, up to REVOCATION_SYNC_INTERVAL seconds later.
+
+The store is the RevokedToken table by default, any object with the same async
+methods as RevocationStore can be assigned to REVOCATIONS.store instead.
+"""
+
+import asyncio
+from datetime import datetime
+
+from app import settings
+from utils.bloom import BloomFilter
+
+__all__ = ["REVOCATIONS", "Revocations", "RevocationStore"]
+
+
+class RevocationStore:
+    """
+    Stores revoked jti claims in the RevokedToken table.
+    """
+
+    # pylint: disable=import-outside-toplevel
+
+    async def add(self, jti, expires=None):
+        from models import RevokedToken
+
+        await RevokedToken.bulk_upsert(
+            [RevokedToken(jti=jti, expires=expires)], conflict=("jti",)
+        )
+
+    async def contains(self, jti):
+        from models import RevokedToken
+
+        return bool(await RevokedToken.count(RevokedToken.c.jti == jti))
+
+    async def jtis(self):
+        from models import RevokedToken
+
+        expires = RevokedToken.c.expires
+        clause = expires.is_(None) | (expires > datetime.utcnow())
+        async for row in RevokedToken.iterate(clause, parse=False):
+            yield row["jti"]
+
+    async def purge(self):
+        from database import database
+        from models import RevokedToken
+
+        table = RevokedToken.table
+        await database.execute(
+            table.delete().where(table.c.expires < datetime.utcnow())
+        )
+
+
+class Revocations:
+    def __init__(self, store=None):
+        self.store = store or RevocationStore()
+        self.bloom = BloomFilter(settings.REVOCATION_BLOOM_CAPACITY)
+        self._task = None
+        # Revoked while rebuilding, these may be missing from the new filter
+        self._rebuilding = None
+
+    async def revoke(self, jti, expires=None):
+        await self.store.add(jti, expires)
+        self.bloom.add(jti)
+        if self._rebuilding is not None:
+            self._rebuilding.add(jti)
+
+    async def is_revoked(self, jti):
+        if not jti or jti not in self.bloom:
+            # Revoked in another process since the last rebuild also ends up here
+            return False
+        # Confirm possible false positives with the store
+        return await self.store.contains(jti)
+
+    async def rebuild(self):
+        self._rebuilding = set()
+        try:
+            await self.store.purge()
+            jtis = [jti async for jti in self.store.jtis()]
+            capacity = max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(jtis))
+            bloom = BloomFilter(capacity)
+            for jti in (*jtis, *self._rebuilding):
+                bloom.add(jti)
+            self.bloom = bloom
+        finally:
+            self._rebuilding = None
+
+    async def _sync(self):
+        while True:
+            await asyncio.sleep(settings.REVOCATION_SYNC_INTERVAL)
+            try:
+                await self.rebuild()
+            except Exception:  # pylint: disable=broad-except
+                import traceback
+
+                traceback.print_exc()
+
+    async def start(self):
+        await self.rebuild()
+        self._task = asyncio.ensure_future(self._sync())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+REVOCATIONS = Revocations()
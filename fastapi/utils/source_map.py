@@ -1,25 +1,432 @@
-import aiohttp
+"""
+Cached source maps and server side stack trace symbolication.
+
+Source maps are kept in an in-memory LRU of SOURCEMAP_CACHE_SIZE maps backed by
+an on-disk cache in SOURCEMAP_CACHE_DIR, keyed by filename and version (the
+ETag, B2's X-Bz-Content-Sha1 or a hash of the contents). Cached maps are
+revalidated with a conditional request every SOURCEMAP_REVALIDATE seconds and
+only decoded again when the version changed.
+
+The VLQ mappings are decoded once into a SourceMap index of parallel arrays,
+where the generated (line, column) of each segment is packed into a single
+sorted 64 bit key so a position is found with a binary search. The index is
+also written to disk, so a restart doesn't decode every map again.
+
+symbolicate() maps a whole Chrome, Firefox or Safari stack trace back to the
+original sources, loading each source map it references once.
+"""
+
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import re
+from array import array
+from bisect import bisect_right
+from time import monotonic
+from urllib.parse import quote, urlparse
 
 from app import settings
-from utils.bunnycdn import bunny
-from utils.downloads import create_s3_download_url, create_b2_download_url
+from utils.b2 import b2_authorize_account
+from utils.downloads import create_s3_download_url
+from utils.http import http_session
+from utils.lru import LRUCache
+
+__all__ = [
+    "SOURCE_MAPS",
+    "SourceMap",
+    "SourceMapCache",
+    "download_source_map",
+    "parse_stack",
+    "symbolicate",
+]
+
+
+_BASE64 = {
+    char: index
+    for index, char in enumerate(
+        "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+    )
+}
+
+# The arrays of the index in the order they are stored on disk
+_INDEX_ARRAYS = (
+    ("keys", "Q"),
+    ("sources", "i"),
+    ("lines", "i"),
+    ("columns", "i"),
+    ("names", "i"),
+)
+
+
+def _decode_vlq(segment):
+    values = []
+    value = 0
+    shift = 0
+    for char in segment:
+        digit = _BASE64[char]
+        value += (digit & 31) << shift
+        if digit & 32:
+            shift += 5
+        else:
+            values.append(-(value >> 1) if value & 1 else value >> 1)
+            value = 0
+            shift = 0
+    return values
+
+
+class SourceMap:
+    """
+    A decoded source map, positions are 0 based as in the source map format.
+    """
+
+    def __init__(self, sources, names, keys, source_ids, lines, columns, name_ids):
+        self.sources = sources
+        self.names = names
+        # (generated line << 32 | generated column) of each segment in ascending order
+        self.keys = keys
+        # Original position of each segment, source and name are -1 when missing
+        self.source_ids = source_ids
+        self.lines = lines
+        self.columns = columns
+        self.name_ids = name_ids
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        root = data.get("sourceRoot") or ""
+        if root and not root.endswith("/"):
+            root += "/"
+        arrays = [array(typecode) for _, typecode in _INDEX_ARRAYS]
+        keys, source_ids, lines, columns, name_ids = arrays
+        source = line = column = name = 0
+        for generated_line, group in enumerate(data.get("mappings", "").split(";")):
+            generated_column = 0
+            for segment in group.split(","):
+                if not segment:
+                    continue
+                values = _decode_vlq(segment)
+                generated_column += values[0]
+                keys.append(generated_line << 32 | generated_column)
+                if len(values) < 4:
+                    # Unmapped generated code
+                    source_ids.append(-1)
+                    lines.append(0)
+                    columns.append(0)
+                    name_ids.append(-1)
+                    continue
+                source += values[1]
+                line += values[2]
+                column += values[3]
+                source_ids.append(source)
+                lines.append(line)
+                columns.append(column)
+                if len(values) > 4:
+                    name += values[4]
+                    name_ids.append(name)
+                else:
+                    name_ids.append(-1)
+        sources = [root + s if s else s for s in data.get("sources", [])]
+        return cls(sources, data.get("names", []), *arrays)
+
+    def to_bytes(self):
+        header = json.dumps(
+            {"sources": self.sources, "names": self.names, "count": len(self.keys)}
+        )
+        body = (
+            self.keys,
+            self.source_ids,
+            self.lines,
+            self.columns,
+            self.name_ids,
+        )
+        return b"".join([header.encode("utf-8"), b"\n", *(a.tobytes() for a in body)])
+
+    @classmethod
+    def from_bytes(cls, data):
+        end = data.index(b"\n")
+        header = json.loads(data[:end])
+        offset = end + 1
+        arrays = []
+        for _, typecode in _INDEX_ARRAYS:
+            values = array(typecode)
+            size = values.itemsize * header["count"]
+            values.frombytes(data[offset : offset + size])
+            offset += size
+            arrays.append(values)
+        return cls(header["sources"], header["names"], *arrays)
+
+    def lookup(self, line, column):
+        """
+        Return the original position of a 0 based generated position as a dict
+        of source, line, column and name, or None when it is not mapped.
+        """
+        index = bisect_right(self.keys, line << 32 | column) - 1
+        if index < 0 or self.keys[index] >> 32 != line:
+            return None
+        source_id = self.source_ids[index]
+        if source_id < 0 or source_id >= len(self.sources):
+            return None
+        name_id = self.name_ids[index]
+        return {
+            "source": self.sources[source_id],
+            "line": self.lines[index],
+            "column": self.columns[index],
+            "name": self.names[name_id] if 0 <= name_id < len(self.names) else None,
+        }
+
+
+async def _fetch(filename, etag=None):
+    """
+    Download a source map, returns (status, version, text) where text is None on a
+    304 Not Modified or a 404 Not Found.
+    B2 downloads are retried once with a new authorization after a 401.
+    """
+    bucket = settings.SOURCEMAP_BUCKET
+    provider = settings.SOURCEMAP_BUCKET_PROVIDER
+    session = http_session()
+    headers = {"If-None-Match": etag} if etag else {}
+    for retry in (True, False):
+        if provider == "b2":
+            auth = await b2_authorize_account(session, force=not retry)
+            url = f"{auth['downloadUrl']}/file/{bucket}/{quote(filename)}"
+            headers["Authorization"] = auth["authorizationToken"]
+        elif provider == "bunnycdn":
+            url = f"{settings.BUNNYCDN_STORAGE_URL}/{bucket}/{filename}"
+            headers["AccessKey"] = os.getenv("BUNNYCDN_STORAGE_ACCESS_KEY")
+        elif provider == "s3":
+            url = create_s3_download_url(bucket, filename)
+        else:
+            return 404, None, None
+        async with session.get(url, headers=headers) as response:
+            if response.status == 401 and provider == "b2" and retry:
+                continue
+            if response.status in (304, 404):
+                return response.status, etag, None
+            response.raise_for_status()
+            text = await response.text()
+            version = response.headers.get("ETag") or response.headers.get(
+                "X-Bz-Content-Sha1"
+            )
+            if not version or version == "none":
+                version = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            return response.status, version, text
+    return 404, None, None
+
+
+def _hash(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class SourceMapCache:
+    def __init__(self):
+        # filename -> (checked, version, SourceMap)
+        self.entries = LRUCache(settings.SOURCEMAP_CACHE_SIZE)
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, filename, version=None):
+        path = os.path.join(settings.SOURCEMAP_CACHE_DIR, _hash(filename))
+        if version is None:
+            return path
+        return f"{path}-{_hash(version)[:16]}"
+
+    def _read_disk(self, filename):
+        # Returns the (version, SourceMap) cached on disk or (None, None)
+        try:
+            with open(self._path(filename) + ".version", encoding="utf-8") as f:
+                version = f.read()
+            path = self._path(filename, version) + ".idx"
+            with open(path, "rb") as f:
+                source_map = SourceMap.from_bytes(f.read())
+            os.utime(path)
+            return version, source_map
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_disk(self, filename, version, text, source_map):
+        os.makedirs(settings.SOURCEMAP_CACHE_DIR, exist_ok=True)
+        for path in glob.glob(self._path(filename) + "-*"):
+            os.remove(path)
+        path = self._path(filename, version)
+        with open(path + ".map", "w", encoding="utf-8") as f:
+            f.write(text)
+        with open(path + ".idx", "wb") as f:
+            f.write(source_map.to_bytes())
+        with open(self._path(filename) + ".version", "w", encoding="utf-8") as f:
+            f.write(version)
+        # Evict the least recently used maps beyond the disk cache size
+        indexes = glob.glob(os.path.join(settings.SOURCEMAP_CACHE_DIR, "*.idx"))
+        if len(indexes) > settings.SOURCEMAP_DISK_CACHE_SIZE:
+            indexes.sort(key=os.path.getmtime)
+            for index in indexes[: len(indexes) - settings.SOURCEMAP_DISK_CACHE_SIZE]:
+                for path in glob.glob(index[:-4] + ".*"):
+                    os.remove(path)
+
+    def _touch(self, filename, version):
+        # Keep maps used from memory at the recent end of the disk LRU
+        try:
+            os.utime(self._path(filename, version) + ".idx")
+        except OSError:
+            pass
+
+    def _set(self, filename, version, source_map):
+        self._touch(filename, version)
+        self.entries.set(filename, (monotonic(), version, source_map))
+
+    async def _load(self, filename):
+        loop = asyncio.get_event_loop()
+        entry = self.entries.get(filename)
+        if entry is not None:
+            _, version, source_map = entry
+        else:
+            version, source_map = await loop.run_in_executor(
+                None, self._read_disk, filename
+            )
+        status, new_version, text = await _fetch(
+            filename, version if source_map is not None else None
+        )
+        if status == 404:
+            self.entries.delete(filename)
+            return None
+        if text is not None and (source_map is None or new_version != version):
+            source_map = await loop.run_in_executor(None, SourceMap.from_json, text)
+            await loop.run_in_executor(
+                None, self._write_disk, filename, new_version, text, source_map
+            )
+        self._set(filename, new_version, source_map)
+        return new_version, source_map
+
+    async def _get(self, filename):
+        # Returns (version, SourceMap) or None if it doesn't exist
+        entry = self.entries.get(filename)
+        if entry is not None and monotonic() - entry[0] < settings.SOURCEMAP_REVALIDATE:
+            self.hits += 1
+            _, version, source_map = entry
+            self._touch(filename, version)
+            return version, source_map
+        self.misses += 1
+        # Concurrent requests for the same map share one download
+        task = self._loading.get(filename)
+        if task is None:
+            task = self._loading[filename] = asyncio.ensure_future(self._load(filename))
+            task.add_done_callback(lambda _: self._loading.pop(filename, None))
+        return await asyncio.shield(task)
+
+    async def get(self, filename):
+        """
+        Return the SourceMap for a filename or None if it doesn't exist.
+        """
+        entry = await self._get(filename)
+        return entry[1] if entry is not None else None
+
+    async def text(self, filename):
+        """
+        Return the source map file contents or None if it doesn't exist.
+        """
+        entry = await self._get(filename)
+        if entry is None:
+            return None
+        version, _ = entry
+        path = self._path(filename, version) + ".map"
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(None, _read_text, path)
+        except OSError:
+            # Evicted from disk by another process, download it again
+            _, _, text = await _fetch(filename)
+            return text
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def _read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+SOURCE_MAPS = SourceMapCache()
 
 
 async def download_source_map(filename):
     if not settings.SOURCEMAP_BUCKET or not settings.SOURCEMAP_BUCKET_PROVIDER:
         return ""
-    bucket = settings.SOURCEMAP_BUCKET
-    provider = settings.SOURCEMAP_BUCKET_PROVIDER
-    if provider == "b2":
-        url = await create_b2_download_url(bucket, filename)
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                return await response.text()
-    elif provider == "bunnycdn":
-        async with aiohttp.ClientSession() as session:
-            return await bunny(session, f"{bucket}/{filename}", None, True)
-    elif provider == "s3":
-        url = create_s3_download_url(bucket, filename)
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                return await response.text()
+    return await SOURCE_MAPS.text(filename)
+
+
+# Chrome: "    at fn (https://example.com/main.js:1:2)" or "    at https://example.com/main.js:1:2"
+_CHROME_FRAME = re.compile(
+    r"^\s*at (?:(?P<function>.+?) \()?(?P<file>\S+?):(?P<line>\d+):(?P<column>\d+)\)?\s*$"
+)
+# Firefox and Safari: "fn@https://example.com/main.js:1:2"
+_FIREFOX_FRAME = re.compile(
+    r"^\s*(?P<function>[^@]*)@(?P<file>\S+?):(?P<line>\d+):(?P<column>\d+)\s*$"
+)
+
+
+def parse_stack(stack):
+    """
+    Split a stack trace into a list of frames, dicts of raw, file, line, column and
+    function where lines that are not frames only have raw.
+    Lines and columns are 1 based as in browser stack traces.
+    """
+    frames = []
+    for raw in stack.splitlines():
+        match = _CHROME_FRAME.match(raw) or _FIREFOX_FRAME.match(raw)
+        if match is None:
+            frames.append({"raw": raw})
+        else:
+            frames.append(
+                {
+                    "raw": raw,
+                    "file": match.group("file"),
+                    "line": int(match.group("line")),
+                    "column": int(match.group("column")),
+                    "function": match.group("function") or None,
+                }
+            )
+    return frames
+
+
+def _source_map_filename(file):
+    # The map of https://example.com/static/js/main.abc123.js is main.abc123.js.map
+    return os.path.basename(urlparse(file).path) + ".map"
+
+
+async def symbolicate(stack):
+    """
+    Map every frame of a stack trace to its original position, frames that could be
+    mapped get an original dict with source, line, column and name (1 based).
+    """
+    frames = parse_stack(stack)
+    filenames = {_source_map_filename(f["file"]) for f in frames if "file" in f}
+    filenames = list(filenames)
+    results = await asyncio.gather(
+        *[SOURCE_MAPS.get(filename) for filename in filenames], return_exceptions=True
+    )
+    source_maps = {
+        filename: result
+        for filename, result in zip(filenames, results)
+        if isinstance(result, SourceMap)
+    }
+    for frame in frames:
+        if "file" not in frame:
+            continue
+        source_map = source_maps.get(_source_map_filename(frame["file"]))
+        original = None
+        if source_map is not None:
+            original = source_map.lookup(frame["line"] - 1, frame["column"] - 1)
+        if original is not None:
+            original["line"] += 1
+            original["column"] += 1
+        frame["original"] = original
+    return frames
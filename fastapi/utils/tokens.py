@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
+from uuid import uuid4
 
 from fastapi import HTTPException
 import jwt
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 from app import settings
-
+from utils.revocation import REVOCATIONS
 
 CREDENTIALS_EXCEPTION = HTTPException(
     status_code=HTTP_401_UNAUTHORIZED,
@@ -17,17 +18,37 @@ CREDENTIALS_EXCEPTION = HTTPException(
 DECODE_ARGS = {
     "key": settings.SECRET_KEY,
     "issuer": settings.TOKEN_ISSUER,
+    "audience": settings.TOKEN_AUDIENCE,
     "algorithms": [settings.TOKEN_ALGORITHM],
 }
 
 
+def decode_token(token):
+    """
+    Decode and verify a token, raises jwt.PyJWTError if it is invalid.
+    Tokens issued before the aud claim was added don't have one, they are still
+    accepted when they have an exp, which limits them to one TOKEN_EXPIRATION
+    after upgrading. Those tokens also have no jti, so they can't be revoked.
+    """
+    try:
+        return jwt.decode(token, **DECODE_ARGS)
+    except jwt.MissingRequiredClaimError as e:
+        if e.claim != "aud":
+            raise
+    claims = jwt.decode(token, **DECODE_ARGS, options={"verify_aud": False})
+    if "exp" not in claims:
+        raise jwt.MissingRequiredClaimError("exp")
+    return claims
+
+
 def create_token(*, data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     to_encode["iss"] = settings.TOKEN_ISSUER
+    to_encode["aud"] = settings.TOKEN_AUDIENCE
+    # Unique id of the token for revocation
+    to_encode["jti"] = uuid4().hex
     if expires_delta:
-        if expires_delta == timedelta.max:
-            to_encode["aud"] = settings.TOKEN_AUDIENCE
-        else:
+        if expires_delta != timedelta.max:
             to_encode["exp"] = datetime.utcnow() + expires_delta
     else:
         to_encode["exp"] = datetime.utcnow() + timedelta(minutes=15)
@@ -37,5 +58,13 @@ def create_token(*, data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-def revoke_token(token):
-    pass
+async def revoke_token(token):
+    try:
+        payload = decode_token(token)
+    except jwt.PyJWTError:
+        raise CREDENTIALS_EXCEPTION
+    if payload.get("jti"):
+        expires = payload.get("exp")
+        if expires is not None:
+            expires = datetime.utcfromtimestamp(expires)
+        await REVOCATIONS.revoke(payload["jti"], expires)
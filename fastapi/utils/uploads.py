@@ -1,15 +1,51 @@
+import asyncio
 import hashlib
 import mimetypes
+import mmap
 import os
 from urllib.parse import urlparse, quote
 
 import aiofiles
-import aiohttp
+from aiohttp import (
+    ClientConnectionError,
+    ClientError,
+    ClientPayloadError,
+    ClientTimeout,
+)
 
 import models
 from app import settings
-from utils.b2 import b2, b2_authorize_account, b2_get_bucket_id
+from utils.b2 import (
+    UPLOAD_URLS,
+    b2,
+    b2_authorize_account,
+    b2_get_bucket_id,
+    b2_get_upload_url,
+)
+from utils.bunnycdn import bunny
 from utils.casing import camel_case_dict
+from utils.http import http_session
+from utils.jobs import JOBS
+
+# Resizing and transcoding can take much longer than the default read timeout
+PROCESSING_TIMEOUT = ClientTimeout(total=None, sock_read=None)
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class MediaDownloadError(Exception):
+    pass
+
+
+class RenditionUploadError(Exception):
+    """
+    Some renditions of a media item failed to upload, failures maps each key to its error.
+    """
+
+    def __init__(self, id_, failures):
+        super().__init__(f"Failed to upload {len(failures)} renditions of {id_}")
+        self.id = id_
+        self.failures = failures
 
 
 def create_s3_upload_url(bucket, key):
@@ -37,64 +73,317 @@ async def create_b2_upload_url(bucket, key):
         "X-Bz-File-Name": key
         "X-Bz-Content-Sha1": sha1 hex
     """
-    async with aiohttp.ClientSession() as session:
+    response = await b2_get_upload_url(http_session(), bucket)
+    response["key"] = key
+    return response
+
+
+async def _open_media_download(session, url, headers):
+    # Returns the response for a GET of url, B2 urls are retried once on a 401
+    is_b2 = url.find("backblazeb2.com") != -1
+    if is_b2:
         auth = await b2_authorize_account(session)
-        bucket_id = await b2_get_bucket_id(session, auth, bucket)
-        response = await b2(
-            session, "b2_get_upload_url", {}, auth, {"bucketId": bucket_id}
+        headers["Authorization"] = auth["authorizationToken"]
+    response = await session.get(url, headers=headers)
+    if response.status == 401 and is_b2:
+        # The cached authorization expired early, refresh it and retry once
+        response.release()
+        auth = await b2_authorize_account(session, force=True)
+        headers["Authorization"] = auth["authorizationToken"]
+        response = await session.get(url, headers=headers)
+    if response.status >= 400:
+        response.release()
+        response.raise_for_status()
+    return response
+
+
+def _preallocate(fd, length):
+    try:
+        os.posix_fallocate(fd, 0, length)
+    except (AttributeError, OSError):
+        # Not supported on this platform or filesystem, the file just grows as written
+        pass
+
+
+async def _stream_media_download(session, url, response, f):
+    """
+    Write the response body into f and return the SHA1 of the written data.
+    Dropped connections are resumed with a range request.
+    """
+    hash_ = hashlib.sha1()
+    written = 0
+    attempt = 1
+    while True:
+        try:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > settings.MEDIA_DOWNLOAD_MAX_SIZE:
+                    raise MediaDownloadError(f"{url} is larger than the size limit")
+                hash_.update(chunk)
+                await f.write(chunk)
+            break
+        except (ClientPayloadError, ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= settings.MEDIA_DOWNLOAD_ATTEMPTS:
+                raise
+            attempt += 1
+        finally:
+            response.release()
+        response = await _open_media_download(
+            session, url, {"Range": f"bytes={written}-"}
         )
-        response["key"] = key
-        return response
+        if response.status != 206:
+            # The range was ignored, start over from the beginning
+            hash_ = hashlib.sha1()
+            written = 0
+            await f.seek(0)
+    # Drop any preallocated space that was not written
+    await f.truncate(written)
+    return hash_.hexdigest()
 
 
 async def _download_media_upload(url, path, ext=None):
-    # Download into url into path
-    async with aiohttp.ClientSession() as session:
-        if url.find("backblazeb2.com") != -1:
-            auth = await b2_authorize_account(session)
-            async with session.get(
-                url, headers={"Authorization": auth["authorizationToken"]}
-            ) as response:
-                data = await response.read()
-        else:
-            async with session.get(url) as response:
-                data = await response.read()
-        if not ext:
-            extensions = mimetypes.guess_all_extensions(response.content_type)
-            extensions.sort(key=len, reverse=True)
-            ext = extensions and extensions[0] or ".dat"
-        path = path + ext
+    # Stream url into path without holding the file in memory
+    session = http_session()
+    response = await _open_media_download(session, url, {})
+    length = response.content_length
+    if length and length > settings.MEDIA_DOWNLOAD_MAX_SIZE:
+        response.release()
+        raise MediaDownloadError(f"{url} is larger than the size limit")
+    if not ext:
+        extensions = mimetypes.guess_all_extensions(response.content_type)
+        extensions.sort(key=len, reverse=True)
+        ext = extensions and extensions[0] or ".dat"
+    path = path + ext
+    # B2 sends the SHA1 of the whole file, large files have "none" instead
+    expected_sha1 = response.headers.get("X-Bz-Content-Sha1", "")
+    try:
         async with aiofiles.open(path, "wb") as f:
-            await f.write(data)
-        return os.path.basename(path)
+            if length:
+                await asyncio.get_event_loop().run_in_executor(
+                    None, _preallocate, f.fileno(), length
+                )
+            sha1 = await _stream_media_download(session, url, response, f)
+        if len(expected_sha1) == 40 and sha1 != expected_sha1:
+            raise MediaDownloadError(f"{url} failed the SHA1 check")
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return os.path.basename(path)
 
 
-async def _media_streamer(filename):
+async def _media_streamer(filename, hash_=None):
+    # With a hash the SHA1 is computed while streaming and appended to the body
     async with aiofiles.open(filename, "rb") as f:
         chunk = await f.read(64 * 1024)
         while chunk:
+            if hash_ is not None:
+                hash_.update(chunk)
             yield chunk
             chunk = await f.read(64 * 1024)
+    if hash_ is not None:
+        yield hash_.hexdigest().encode("ascii")
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+async def _upload_part(session, auth, file_id, upload_url, number, data):
+    """
+    Upload one part of a large file, returns the part SHA1 and the upload URL to reuse.
+    """
+    loop = asyncio.get_event_loop()
+    sha1 = await loop.run_in_executor(None, _sha1, data)
+    # B2 asks for a new upload URL after a 401 or 503, so retry once with another
+    for retry in (True, False):
+        if upload_url is None:
+            upload_url = await b2(
+                session, "b2_get_upload_part_url", {}, auth, {"fileId": file_id}
+            )
+        headers = {
+            "Authorization": upload_url["authorizationToken"],
+            "Content-Length": str(len(data)),
+            "X-Bz-Part-Number": str(number),
+            "X-Bz-Content-Sha1": sha1,
+        }
+        async with session.post(
+            upload_url["uploadUrl"], headers=headers, data=data
+        ) as response:
+            await response.read()
+        if response.status not in (401, 503) or not retry:
+            break
+        upload_url = None
+    response.raise_for_status()
+    return sha1, upload_url
+
+
+async def _upload_large_media(session, filename, key, size):
+    """
+    Upload a file as a B2 large file, parts are uploaded in parallel from a memory map.
+    """
+    auth = await b2_authorize_account(session)
+    bucket_id = await b2_get_bucket_id(session, auth, settings.MEDIA_BUCKET)
+    large_file = await b2(
+        session,
+        "b2_start_large_file",
+        {},
+        auth,
+        {
+            "bucketId": bucket_id,
+            "fileName": key,
+            "contentType": mimetypes.guess_type(key)[0] or "b2/x-auto",
+        },
+    )
+    file_id = large_file["fileId"]
+    part_size = max(settings.B2_PART_SIZE, auth["absoluteMinimumPartSize"])
+    part_count = -(-size // part_size)
+    part_sha1s = [None] * part_count
+    parts = iter(range(part_count))
+    errors = []
+
+    async def worker(view):
+        # Each worker needs its own part upload URL
+        upload_url = None
+        for index in parts:
+            if errors:
+                return
+            start = index * part_size
+            with view[start : start + part_size] as data:
+                try:
+                    part_sha1s[index], upload_url = await _upload_part(
+                        session, auth, file_id, upload_url, index + 1, data
+                    )
+                except Exception as e:  # pylint: disable=broad-except
+                    errors.append(e)
+                    return
+
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                # Workers stop taking parts after an error, so no slice outlives the map
+                await asyncio.gather(
+                    *[
+                        worker(view)
+                        for _ in range(min(settings.B2_PART_CONCURRENCY, part_count))
+                    ]
+                )
+    if errors:
+        await b2(session, "b2_cancel_large_file", {}, auth, {"fileId": file_id})
+        raise errors[0]
+    return await b2(
+        session,
+        "b2_finish_large_file",
+        {},
+        auth,
+        {"fileId": file_id, "partSha1Array": part_sha1s},
+    )
 
 
 async def _upload_media(filename, key):
     if settings.MEDIA_BUCKET_PROVIDER == "b2":
-        upload_url = await create_b2_upload_url(settings.MEDIA_BUCKET, key)
-        async with aiohttp.ClientSession() as session:
-            hash_ = hashlib.sha1()
-            async for chunk in _media_streamer(filename):
-                hash_.update(chunk)
-            headers = {
-                "Authorization": upload_url["authorizationToken"],
-                "Content-Length": str(os.path.getsize(filename)),
-                "Content-Type": mimetypes.guess_type(key)[0],
-                "X-Bz-File-Name": quote(key),
-                "X-Bz-Content-Sha1": hash_.hexdigest(),
-            }
-            async with session.post(
-                upload_url["uploadUrl"], headers=headers, data=_media_streamer(filename)
-            ) as response:
-                return await response.json()
+        session = http_session()
+        size = os.path.getsize(filename)
+        if size > settings.B2_LARGE_FILE_THRESHOLD:
+            return await _upload_large_media(session, filename, key, size)
+        # The SHA1 is sent after the file contents so the file is only read once
+        headers = {
+            "Content-Length": str(size + 40),
+            "Content-Type": mimetypes.guess_type(key)[0] or "b2/x-auto",
+            "X-Bz-File-Name": quote(key),
+            "X-Bz-Content-Sha1": "hex_digits_at_end",
+        }
+        for retry in (True, False):
+            upload_url = await UPLOAD_URLS.checkout(session, settings.MEDIA_BUCKET)
+            headers["Authorization"] = upload_url["authorizationToken"]
+            try:
+                async with session.post(
+                    upload_url["uploadUrl"],
+                    headers=headers,
+                    data=_media_streamer(filename, hashlib.sha1()),
+                ) as response:
+                    result = await response.json()
+            except Exception:
+                UPLOAD_URLS.discard(session, settings.MEDIA_BUCKET, upload_url)
+                raise
+            if 200 <= response.status < 300:
+                UPLOAD_URLS.release(settings.MEDIA_BUCKET, upload_url)
+                return result
+            # B2 says not to reuse an upload URL after any failed upload
+            UPLOAD_URLS.discard(session, settings.MEDIA_BUCKET, upload_url)
+            if response.status not in (401, 503) or not retry:
+                break
+        response.raise_for_status()
+        return result
+
+
+async def _upload_media_with_retry(filename, key):
+    for attempt in range(settings.UPLOAD_ATTEMPTS):
+        try:
+            return await _upload_media(filename, key)
+        except (ClientError, asyncio.TimeoutError):
+            if attempt + 1 >= settings.UPLOAD_ATTEMPTS:
+                raise
+        await asyncio.sleep(settings.UPLOAD_RETRY_DELAY * 2**attempt)
+
+
+def _rendition_key(size, id_, ext):
+    return f"{size}/{id_[0:2]}/{id_[2:4]}/{id_[4:6]}/{id_}{ext}"
+
+
+async def _upload_renditions(paths, sizes, id_):
+    """
+    Upload the rendition files for sizes concurrently and delete every file in paths.
+    Raises RenditionUploadError with the failed keys after all the uploads finished.
+    """
+    semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+
+    async def upload(size, path):
+        try:
+            # Upload to permanent storage (where key is not metadata)
+            if size in sizes:
+                async with semaphore:
+                    await _upload_media_with_retry(
+                        path, _rendition_key(size, id_, os.path.splitext(path)[1])
+                    )
+        finally:
+            # Delete the file
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    items = list(paths.items())
+    results = await asyncio.gather(
+        *[upload(size, path) for size, path in items], return_exceptions=True
+    )
+    failures = {
+        _rendition_key(size, id_, os.path.splitext(path)[1]): error
+        for (size, path), error in zip(items, results)
+        if isinstance(error, Exception)
+    }
+    if failures:
+        raise RenditionUploadError(id_, failures)
+
+
+async def _save_metadata(model_name, id_, metadata):
+    model_type = getattr(models, model_name)
+    obj = await model_type.get(id_)
+    await obj.save(camel_case_dict(metadata), read_only=True)
+    return obj
+
+
+async def _process_renditions(model_name, result, sizes, id_):
+    # Save the metadata into the database while the renditions upload
+    uploads = asyncio.ensure_future(_upload_renditions(result["paths"], sizes, id_))
+    try:
+        if model_name:
+            return await _save_metadata(model_name, id_, result["metadata"])
+        return None
+    finally:
+        await uploads
 
 
 async def resize_image(model_name, url, sizes, id_):
@@ -103,28 +392,15 @@ async def resize_image(model_name, url, sizes, id_):
     ext = os.path.splitext(urlparse(url).path)[1]
     filename = await _download_media_upload(url, f"/run/resizer/{id_}", ext)
     sizes_param = ",".join(sizes)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"http://resizer:8005/?filename={filename}&sizes={sizes_param}"
-        ) as response:
-            result = await response.json()
-            for size, path in result["paths"].items():
-                ext = os.path.splitext(path)[1]
-                # Upload to permanent storage (where key is not metadata)
-                if size in sizes:
-                    await _upload_media(
-                        path, f"{size}/{id_[0:2]}/{id_[2:4]}/{id_[4:6]}/{id_}{ext}"
-                    )
-                # Delete the file
-                os.remove(path)
-
-            # Save the metadata into the database
-            if model_name:
-                model_type = getattr(models, model_name)
-                image = await model_type.get(id_)
-                await image.save(camel_case_dict(result["metadata"]), read_only=True)
-                # Example metadata:
-                # {"exif":{"DateTimeOriginal":1569428593,"ColorSpace":1,"ExifImageWidth":750,"ExifImageHeight":1334},"format":"jpeg","hasAlpha":false,"width":750,"height":1334}
+    session = http_session()
+    async with session.get(
+        f"http://resizer:8005/?filename={filename}&sizes={sizes_param}",
+        timeout=PROCESSING_TIMEOUT,
+    ) as response:
+        result = await response.json()
+    await _process_renditions(model_name, result, sizes, id_)
+    # Example metadata:
+    # {"exif":{"DateTimeOriginal":1569428593,"ColorSpace":1,"ExifImageWidth":750,"ExifImageHeight":1334},"format":"jpeg","hasAlpha":false,"width":750,"height":1334}
 
 
 async def transcode_video(model_name, url, sizes, poster_sizes, id_):
@@ -133,43 +409,97 @@ async def transcode_video(model_name, url, sizes, poster_sizes, id_):
     ext = os.path.splitext(urlparse(url).path)[1]
     filename = await _download_media_upload(url, f"/run/transcoder/{id_}", ext)
     sizes_param = ",".join(sizes)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"http://transcoder:8006/?filename={filename}&sizes={sizes_param}"
-        ) as response:
-            result = await response.json()
-            for size, path in result["paths"].items():
-                ext = os.path.splitext(path)[1]
-                # Upload to permanent storage (where key is not metadata)
-                if size in sizes or size == "poster":
-                    await _upload_media(
-                        path, f"{size}/{id_[0:2]}/{id_[2:4]}/{id_[4:6]}/{id_}{ext}"
-                    )
-                # Delete the file
-                os.remove(path)
+    session = http_session()
+    async with session.get(
+        f"http://transcoder:8006/?filename={filename}&sizes={sizes_param}",
+        timeout=PROCESSING_TIMEOUT,
+    ) as response:
+        result = await response.json()
+    video = await _process_renditions(model_name, result, [*sizes, "poster"], id_)
 
-            # Save the metadata into the database
-            model_type = getattr(models, model_name)
-            video = await model_type.get(id_)
-            await video.save(camel_case_dict(result["metadata"]), read_only=True)
+    # Create poster images as needed
+    if poster_sizes:
+        await resize_image(None, video.poster_url, poster_sizes, id_)
 
-            # Create poster images as needed
-            if poster_sizes:
-                await resize_image(None, video.poster_url, poster_sizes, id_)
 
+class MediaDeleteError(Exception):
+    """
+    Some renditions failed to delete, report maps every key to None or its error.
+    """
 
-async def delete_media(sizes, id_, ext):
-    id_ = str(id_)
+    def __init__(self, report):
+        failed = sum(1 for error in report.values() if error is not None)
+        super().__init__(f"Failed to delete {failed} of {len(report)} files")
+        self.report = report
+
+
+async def delete_media_bulk(items):
+    """
+    Delete the renditions of many media items, items is an iterable of (id, ext, sizes).
+    Deletes are sent concurrently, at most DELETE_CONCURRENCY at once.
+    Returns a dict mapping each key to None when deleted or to the error message.
+    """
+    keys = [
+        _rendition_key(size, str(id_), ext)
+        for id_, ext, sizes in items
+        for size in sizes
+    ]
+    report = dict.fromkeys(keys)
+    if not keys:
+        return report
+    session = http_session()
     if settings.MEDIA_BUCKET_PROVIDER == "b2":
-        async with aiohttp.ClientSession() as session:
-            auth = await b2_authorize_account(session)
-            bucket_id = await b2_get_bucket_id(session, auth, settings.MEDIA_BUCKET)
-            for size in sizes:
-                key = f"{size}/{id_[0:2]}/{id_[2:4]}/{id_[4:6]}/{id_}{ext}"
-                await b2(
-                    session,
-                    "b2_hide_file",
-                    {},
-                    auth,
-                    {"bucketId": bucket_id, "fileName": key},
-                )
+        auth = await b2_authorize_account(session)
+        bucket_id = await b2_get_bucket_id(session, auth, settings.MEDIA_BUCKET)
+
+        async def delete(key):
+            await b2(
+                session,
+                "b2_hide_file",
+                {},
+                auth,
+                {"bucketId": bucket_id, "fileName": key},
+            )
+
+    elif settings.MEDIA_BUCKET_PROVIDER == "bunnycdn":
+
+        async def delete(key):
+            await bunny(
+                session, f"{settings.MEDIA_BUCKET}/{key}", storage=True, delete=True
+            )
+
+    else:
+        return report
+
+    semaphore = asyncio.Semaphore(settings.DELETE_CONCURRENCY)
+
+    async def delete_key(key):
+        async with semaphore:
+            try:
+                await delete(key)
+            except (ClientError, asyncio.TimeoutError) as e:
+                report[key] = str(e) or e.__class__.__name__
+
+    await asyncio.gather(*[delete_key(key) for key in keys])
+    return report
+
+
+def _raise_on_failures(report):
+    if any(error is not None for error in report.values()):
+        raise MediaDeleteError(report)
+
+
+async def delete_media(sizes, id_, ext):
+    _raise_on_failures(await delete_media_bulk([(id_, ext, sizes)]))
+
+
+async def _delete_media_bulk_job(items):
+    # As a job failures have to raise, or the failed keys are never retried
+    _raise_on_failures(await delete_media_bulk(items))
+
+
+# Run by worker.py, e.g. await JOBS.enqueue("resize_image", "Image", url, sizes, str(id_))
+JOBS.register("resize_image", resize_image)
+JOBS.register("transcode_video", transcode_video)
+JOBS.register("delete_media", delete_media)
+JOBS.register("delete_media_bulk", _delete_media_bulk_job)
@@ -0,0 +1,37 @@
+#!./venv/bin/python
+"""
+Runs the background jobs added with utils.jobs.JOBS.enqueue() until stopped.
+Optionally takes the job types to run as arguments, by default all of them.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+
+from database import database
+from database.cache import MODEL_CACHE
+from utils.http import HTTP_CLIENT
+from utils.jobs import JOBS
+import utils.uploads  # pylint: disable=unused-import
+
+
+async def main(types):
+    await database.connect()
+    await MODEL_CACHE.connect()
+    HTTP_CLIENT.start()
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, JOBS.stop)
+    try:
+        await JOBS.run(types or None)
+    finally:
+        await HTTP_CLIENT.stop()
+        await MODEL_CACHE.disconnect()
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    if os.getenv("FASTAPI_DOCKER"):
+        os.system("./venv/bin/python wait.py")
+    asyncio.run(main(sys.argv[1:]))